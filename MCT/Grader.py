@@ -1,6 +1,7 @@
 from queue import PriorityQueue
 import random
 from agent import Agent
+from teams import to_mask, team_size
 
 class Grader:
     '''An abstract super class for an agent in the game The Resistance.
@@ -69,6 +70,7 @@ class Grader:
         self.fails_required = 1
         self.player_list = []
         self.spy_list = spies
+        self.spy_mask = to_mask(spies)
         self.votes_thisRound = []
         num = 0
         while len(self.player_list) in range(self.number_of_players):
@@ -137,10 +139,7 @@ class Grader:
         elif self.is_spy():
             # vote yes if there are enough spies in the mission
             # '''可以添加一步判断，是否为第三次使任务失败，支持提出者是否有暴露的风险'''
-            _in_mission = 0
-            for agent in mission:
-                if agent in self.spy_list:
-                    _in_mission += 1
+            _in_mission = team_size(to_mask(mission) & self.spy_mask)
             if _in_mission >= self.fails_required:
                 return True
             else:
@@ -2,10 +2,17 @@ from agent import Agent
 import random
 from MCT_decision import MCT_Resistance_Node
 from MCT_decision import MCTSearch
+from MCT_decision import RandomRollout
+from MCT_decision import ITERATIONS
+from teams import to_mask
 
 
 class MCTAgent(Agent):
     '''An agent based on MCT decision'''
+    # constructor of the root of a search, with the parameters of MCT_Resistance_Node
+    new_node = MCT_Resistance_Node
+    # processes searching each decision at once (see MCTSearch), e.g. os.cpu_count()
+    search_workers = 1
 
     def __init__(self, name='Rando'):
         '''
@@ -29,6 +36,7 @@ class MCTAgent(Agent):
         self.curr_node = None
         self.vote_times = 0
         self.clearly_know = []
+        # bitmasks of the teams sent on missions (see teams)
         self.teams_failed = []
 
     def new_game(self, number_of_players, player_number, spy_list):
@@ -41,6 +49,9 @@ class MCTAgent(Agent):
         self.player_number = player_number
         self.spy_list = spy_list
         self.fails_required = 1
+        self.teams_failed = []
+        # the search simulates games in which this agent is never a spy
+        self.rollout = RandomRollout(resistance=[player_number])
 
         self.player_list = []
         num = 0
@@ -68,8 +79,12 @@ class MCTAgent(Agent):
                     team.append(agent)
             return team
 
+        team = []
         if not self.is_spy():
             team = self.best_child.get_team
+        # the node searched last may not be a team of this mission (e.g. the last node of a finished search)
+        if len(team) != team_size:
+            team = random.sample(self.player_list, team_size)
         return team
 
     def vote(self, mission, proposer):
@@ -122,9 +137,10 @@ class MCTAgent(Agent):
         and mission_success is True if there were not enough betrayals to cause the mission to fail, False otherwise.
         It iss not expected or required for this function to return anything.
         '''
+        self.rollout.observe(mission, betrayals)
         # Having the outcome of first mission, now we can initialize a  MCT search
         self.mission = mission
-        self.teams_failed.append(mission)
+        self.teams_failed.append(to_mask(mission))
         self.mission_success = mission_success
 
     def round_outcome(self, rounds_complete, missions_failed):
@@ -134,18 +150,29 @@ class MCTAgent(Agent):
         missions_failed, the numbe of missions (0-3) that have failed.
         '''
         if self.round_index == 0:
-            self.curr_node = MCT_Resistance_Node(self.mission, self.mission_success, self.round_index,
-                                                 missions_failed, True, self.number_of_players, self.player_list, parent=None)
-            self.Tree = MCTSearch(self.curr_node)
+            self.curr_node = self.new_node(self.mission, self.mission_success, self.round_index,
+                                          missions_failed, True, self.number_of_players, self.player_list, parent=None)
+            self.Tree = MCTSearch(self.curr_node, self.rollout, self.search_workers)
 
         # if the game haven't finished yet, assign current state to self.curr_node
         elif rounds_complete - missions_failed < 3 and missions_failed < 3:
-            for node in self.curr_node.children:
-                if set(node.team) == set(self.mission) and node.missions_failed == missions_failed and self.round_index == node.round_index and self.best_vote == node.get_vote:
-                    self.curr_node = node
-                    self.Tree = MCTSearch(self.curr_node)
+            node = self.curr_node.child(self.mission, self.mission_success, self.best_vote)
+            if node is not None:
+                # the subtree of the state reached is kept, with its statistics, for the next search
+                node.detach()
+                self.curr_node = node
+                self.Tree = MCTSearch(self.curr_node, self.rollout, self.search_workers)
+            else:
+                # the search widened the node without reaching this state, start a new tree from it
+                self.curr_node = self.new_node(self.mission, self.mission_success, self.round_index,
+                                              missions_failed, self.best_vote, self.number_of_players,
+                                              self.player_list, parent=None)
+                self.Tree = MCTSearch(self.curr_node, self.rollout, self.search_workers)
         if not self.curr_node.is_terminal_node:
-            self.best_child = self.Tree.best_action(self.teams_failed)
+            # a search continued from a kept subtree only tops its visits up to ITERATIONS,
+            # with at least a tenth of them new
+            iterations = max(ITERATIONS // 10, ITERATIONS - int(self.curr_node.n))
+            self.best_child = self.Tree.best_action(self.teams_failed, iterations)
         else:
             self.best_child = self.curr_node
         self.round_index += 1
@@ -163,3 +190,15 @@ class MCTAgent(Agent):
         self.best_vote = True
         self.curr_node = None
         self.vote_times = 0
+        self.teams_failed = []
+
+
+def array_node(*args, **kwargs):
+    # the root of an ArrayTree, MCT_arrays imported when first used so MCTAgent does not need NumPy
+    from MCT_arrays import array_root
+    return array_root(*args, **kwargs)
+
+
+class MCTArrayAgent(MCTAgent):
+    '''An MCTAgent searching a tree stored in arrays (see MCT_arrays)'''
+    new_node = staticmethod(array_node)
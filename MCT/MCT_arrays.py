@@ -0,0 +1,329 @@
+'''
+Struct-of-arrays storage for the tree of MCT_decision: one preallocated NumPy array per
+field of a node, a node being an index into them, so creating a node is incrementing
+the size of the tree (the arrays double when they are full) and a node takes 32 bytes.
+MCTSearch runs on it unchanged through ArrayNode, a view of a node with the methods of
+MCT_Resistance_Node:
+
+    root = array_root(team, outcome, round_index, missions_failed, vote, number_of_players, player_list)
+    best_child = MCTSearch(root, rollout).best_action(teams_failed)
+
+The children of a node are blocks of 4 consecutive nodes, one block per team in
+CHILD_ORDER, created by progressive widening as in MCT_decision.
+The blocks of a node form a list: first_child is the first node of its newest block,
+and next_team the first node of the block created before it.
+'''
+from math import ceil, gcd, log
+import random
+import numpy as np
+from agent import Agent
+from teams import TEAMS, from_mask, is_subset, to_mask
+from MCT_decision import CHILD_ORDER, UCT_C, WIDENING_ALPHA, WIDENING_C
+
+# name -> dtype of the arrays of a tree
+FIELDS = (
+    ('visits', '<u4'),
+    ('wins', '<u4'),
+    ('parent', '<i4'),
+    ('first_child', '<i4'),
+    ('next_team', '<i4'),
+    ('team', '<u2'),
+    ('outcome', '?'),
+    ('vote', '?'),
+    ('missions_failed', 'u1'),
+    ('round_index', 'u1'),
+    # progressive widening: teams created, and the random start and step of the order of the teams
+    ('tried', '<u2'),
+    ('team_start', '<u2'),
+    ('team_step', '<u2'),
+)
+NONE = -1
+# offsets of the failed children of the 2 choices (vote True and False) of a block
+CHOICES = np.array([0, 1])
+
+
+class ArrayTree(object):
+
+    def __init__(self, number_of_players, player_list, capacity=1024):
+        """
+        Tree of the nodes of a search, stored as arrays
+        Parameters
+        ----------
+        number_of_players: the number of players for this game
+        player_list: the players, 0 to number_of_players - 1
+        capacity: number of nodes allocated at first
+        """
+        self.number_of_players = number_of_players
+        self.player_list = player_list
+        self.size = 0
+        for name, dtype in FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    @property
+    def capacity(self):
+        return len(self.visits)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name, _ in FIELDS)
+
+    def grow(self):
+        for name, _ in FIELDS:
+            array = getattr(self, name)
+            grown = np.zeros(2 * len(array), dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def add(self, parent, team, outcome, round_index, missions_failed, vote):
+        # returns the index of a new node
+        if self.size == self.capacity:
+            self.grow()
+        i = self.size
+        self.size += 1
+        self.parent[i] = parent
+        self.first_child[i] = NONE
+        self.next_team[i] = NONE
+        self.team[i] = team
+        self.outcome[i] = outcome
+        self.vote[i] = vote
+        self.missions_failed[i] = missions_failed
+        self.round_index[i] = round_index
+        return i
+
+    def subtree(self, i):
+        # returns a new tree holding a copy of the subtree of i, with i as its root (index 0),
+        # blocks of children kept consecutive
+        kept = [i]
+        for node in kept:
+            for block in self.blocks(node):
+                kept.extend(range(block, block + 4))
+        kept = np.array(kept, dtype=np.int64)
+        tree = ArrayTree(self.number_of_players, self.player_list, max(1024, len(kept)))
+        tree.size = len(kept)
+        for name, _ in FIELDS:
+            getattr(tree, name)[:len(kept)] = getattr(self, name)[kept]
+        # old index -> new index
+        new_of = np.full(self.size, NONE, dtype=np.int64)
+        new_of[kept] = np.arange(len(kept))
+        tree.parent[0] = NONE
+        tree.parent[1:len(kept)] = new_of[self.parent[kept[1:]]]
+        for name in ('first_child', 'next_team'):
+            pointers = getattr(tree, name)[:len(kept)]
+            linked = pointers != NONE
+            pointers[linked] = new_of[pointers[linked]]
+        return tree
+
+    def teams_of(self, round_index):
+        # bitmasks of the possible teams of the children of a node of round_index,
+        # which are the teams of mission round_index + 1
+        return TEAMS[self.number_of_players, Agent.mission_sizes[self.number_of_players][round_index + 1]]
+
+    def is_terminal(self, i):
+        missions_failed = int(self.missions_failed[i])
+        return missions_failed >= 3 or int(self.round_index[i]) - missions_failed >= 2
+
+    def blocks(self, i):
+        # yields the first node of every block of children of i, newest first
+        block = int(self.first_child[i])
+        while block != NONE:
+            yield block
+            block = int(self.next_team[block])
+
+    def expand(self, i):
+        # creates the blocks of children allowed by progressive widening for the visits of i,
+        # the teams visited in the order of a random start and a random step prime to their number
+        round_index = int(self.round_index[i])
+        teams = self.teams_of(round_index)
+        count = len(teams)
+        tried = int(self.tried[i])
+        if tried == 0:
+            self.team_start[i] = random.randrange(count)
+            step = random.randrange(1, count) if count > 1 else 1
+            while gcd(step, count) != 1:
+                step -= 1
+            self.team_step[i] = step
+        limit = ceil(WIDENING_C * (int(self.visits[i]) + 1) ** WIDENING_ALPHA)
+        start, step = int(self.team_start[i]), int(self.team_step[i])
+        missions_failed = int(self.missions_failed[i])
+        while tried < count and 4 * tried < limit:
+            team = teams[(start + tried * step) % count]
+            first = NONE
+            for outcome, vote in CHILD_ORDER:
+                child = self.add(i, team, outcome, round_index + 1, missions_failed + (not outcome), vote)
+                if first == NONE:
+                    first = child
+            self.next_team[first] = self.first_child[i]
+            self.first_child[i] = first
+            tried += 1
+        self.tried[i] = tried
+
+    def child(self, i, team, outcome, vote):
+        # returns the child of i for team, outcome and vote, NONE if it was never created,
+        # found by scanning the blocks of i
+        for block in self.blocks(i):
+            if int(self.team[block]) == team:
+                return block + CHILD_ORDER.index((bool(outcome), bool(vote)))
+        return NONE
+
+    def select_child(self, i, rollout, world):
+        # picks the choice of team and vote of i by UCT on the visits of both its outcomes,
+        # trying every choice once first, then lets the simulated world decide the outcome
+        blocks = np.fromiter(self.blocks(i), dtype=np.int64)
+        # failed children of every choice, then their succeeded siblings
+        failed = (blocks[:, None] + CHOICES).reshape(-1)
+        visits = self.visits[failed] + self.visits[failed + 2]
+        least = visits.argmin()
+        if visits[least] == 0:
+            best = int(failed[least])
+        else:
+            wins = self.wins[failed] + self.wins[failed + 2]
+            log_n = log(int(self.visits[i]))
+            weights = wins / visits + UCT_C * np.sqrt(log_n / visits)
+            best = int(failed[np.argmax(weights)])
+        if rollout.mission_fails(world, int(self.team[best]), int(self.round_index[i]) + 1,
+                                 self.number_of_players):
+            return best
+        return best + 2
+
+    def backpropagate(self, i, result):
+        while i != NONE:
+            self.visits[i] += 1
+            if result == True:
+                self.wins[i] += 1
+            i = int(self.parent[i])
+
+    def best_child(self, i, teams_failed):
+        # returns a child of the most visited choice of team and vote of i,
+        # ties broken by the win rate of the choice; choices never visited are left out,
+        # NONE if no choice is left. teams_failed are bitmasks
+        choices_weights = []
+        for block in self.blocks(i):
+            team = int(self.team[block])
+            if any(is_subset(team, failed) for failed in teams_failed):
+                continue
+            for failed in (block, block + 1):
+                n = int(self.visits[failed]) + int(self.visits[failed + 2])
+                if n == 0:
+                    continue
+                weight = (n, (int(self.wins[failed]) + int(self.wins[failed + 2])) / n)
+                succeeded_n = int(self.visits[failed + 2])
+                choices_weights.append((weight, failed + 2 if succeeded_n >= n - succeeded_n else failed))
+        if not choices_weights:
+            return NONE
+        return max(choices_weights, key=lambda choice: choice[0])[1]
+
+
+class ArrayNode(object):
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        """
+        View of a node of an ArrayTree, with the methods of MCT_Resistance_Node
+        Parameters
+        ----------
+        tree: the ArrayTree of the node
+        index: the index of the node in tree
+        """
+        self.tree = tree
+        self.index = index
+
+    @property
+    def team_mask(self):
+        return int(self.tree.team[self.index])
+
+    @property
+    def team(self):
+        return from_mask(self.team_mask)
+
+    @property
+    def get_team(self):
+        return self.team
+
+    @property
+    def outcome(self):
+        return bool(self.tree.outcome[self.index])
+
+    @property
+    def vote(self):
+        return bool(self.tree.vote[self.index])
+
+    @property
+    def get_vote(self):
+        return self.vote
+
+    @property
+    def round_index(self):
+        return int(self.tree.round_index[self.index])
+
+    @property
+    def missions_failed(self):
+        return int(self.tree.missions_failed[self.index])
+
+    @property
+    def number_of_players(self):
+        return self.tree.number_of_players
+
+    @property
+    def player_list(self):
+        return self.tree.player_list
+
+    @property
+    def parent(self):
+        parent = int(self.tree.parent[self.index])
+        return None if parent == NONE else ArrayNode(self.tree, parent)
+
+    @property
+    def children(self):
+        # in the order of MCT_Resistance_Node.children, oldest team first
+        blocks = list(self.tree.blocks(self.index))
+        return [ArrayNode(self.tree, block + offset) for block in reversed(blocks) for offset in range(4)]
+
+    @property
+    def q(self):
+        return int(self.tree.wins[self.index])
+
+    @property
+    def n(self):
+        return int(self.tree.visits[self.index])
+
+    @property
+    def is_terminal_node(self):
+        return self.tree.is_terminal(self.index)
+
+    def rollout(self):
+        if self.missions_failed >= 3:
+            return False
+        return True
+
+    def expand(self):
+        self.tree.expand(self.index)
+
+    def select_child(self, rollout, world):
+        return ArrayNode(self.tree, self.tree.select_child(self.index, rollout, world))
+
+    def backpropagate(self, result):
+        self.tree.backpropagate(self.index, result)
+
+    def best_child(self, teams_failed):
+        child = self.tree.best_child(self.index, teams_failed)
+        return None if child == NONE else ArrayNode(self.tree, child)
+
+    def child(self, team, outcome, vote):
+        child = self.tree.child(self.index, to_mask(team), outcome, vote)
+        return None if child == NONE else ArrayNode(self.tree, child)
+
+    def detach(self):
+        # moves this node and its subtree to a tree of their own, copying them,
+        # so the arrays of the rest of the tree are freed
+        self.tree = self.tree.subtree(self.index)
+        self.index = 0
+
+
+def array_root(team, outcome, round_index, missions_failed, vote, number_of_players, player_list, parent=None):
+    '''
+    returns the root of a new ArrayTree, with the parameters of MCT_Resistance_Node
+    (parent is ignored, a root has none)
+    '''
+    tree = ArrayTree(number_of_players, player_list)
+    return ArrayNode(tree, tree.add(NONE, team if isinstance(team, int) else to_mask(team), outcome, round_index,
+                                    missions_failed, vote))
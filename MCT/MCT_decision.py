@@ -1,28 +1,48 @@
-import numpy as np
-from collections import defaultdict
-from abc import ABC, abstractmethod
 from agent import Agent
+from teams import TEAMS, from_mask, is_subset, to_mask, team_size
 from itertools import combinations
+from math import ceil, gcd, log, sqrt
+import atexit
 import random
 
+# progressive widening: a node visited n times has at most
+# WIDENING_C * (n+1) ** WIDENING_ALPHA children
+WIDENING_C = 4
+WIDENING_ALPHA = 0.5
+# (outcome, vote) of the 4 children of a team, in the order of node.children:
+# children[i + vote offset] failed and children[i + vote offset + 2] succeeded, for i a multiple of 4
+CHILD_ORDER = ((False, True), (False, False), (True, True), (True, False))
+# exploration constant of UCT during the descent
+UCT_C = 1.4
+# iterations of a search
+ITERATIONS = 10000
+# workers -> process pool of the root parallel searches, created when first used
+# and shut down by shutdown(), at the latest when the interpreter exits
+_EXECUTORS = {}
+
 
 class MCT_Resistance_Node():
+    __slots__ = ('team_mask', 'outcome', 'round_index', 'missions_failed', 'number_of_players', 'player_list',
+                 'parent', 'children', 'vote', '_number_of_visits', '_resistance_wins', '_untried', '_index')
 
     def __init__(self, team, outcome, round_index, missions_failed, vote, number_of_players, player_list, parent=None):
         """
         Parameters (All from MCT_agent.round_outcome for the root node)
         ----------
-        team: team attended the mission
+        team: team attended the mission, a list of players or its bitmask (see teams)
         outcome: the mission succeed(True) or failed(False)
-        round_index: the index recoding which round is this node in
+        round_index: the index of the mission whose outcome this node records,
+                     so its children are the teams of mission round_index + 1
         number_of_players: the number of players for this game
         parent : node for the last round of game
         children: nodes for the passible states of next round
         vote: for current state, should I vote True or False
         number_of_visits: how many times this node has been visited
         resistance_wins: how many times this node has won as resistance
+        untried: iterator over the teams without children yet, None until the first expansion
+        index: children by (team bitmask, outcome, vote), None until the first expansion
         """
-        self.team = team
+        self.team_mask = team if isinstance(team, int) else to_mask(team)
         self.outcome = outcome
         self.round_index = round_index
         self.missions_failed = missions_failed
@@ -33,6 +53,12 @@ class MCT_Resistance_Node():
         self.vote = vote
         self._number_of_visits = 0
         self._resistance_wins = 0
+        self._untried = None
+        self._index = None
+
+    @property
+    def team(self):
+        return from_mask(self.team_mask)
 
     @property
     def q(self):
@@ -63,107 +89,338 @@ class MCT_Resistance_Node():
                 result = True
         return result
 
+    def untried_teams(self):
+        # yields every possible team of the next mission, each of which gets 4 children:
+        # 2 possible outcomes, fail and success, and 2 possible votes, True and False.
+        # The teams come in a random order, so that a partly expanded node is a fair sample of them:
+        # a random start and a random step prime to the number of teams visit each team once,
+        # without a shuffled copy of the teams in every node
+        mission_size = Agent.mission_sizes[self.number_of_players][self.round_index + 1]
+        possible_combinations = TEAMS[self.number_of_players, mission_size]
+        count = len(possible_combinations)
+        start = random.randrange(count)
+        step = random.randrange(1, count) if count > 1 else 1
+        while gcd(step, count) != 1:
+            step -= 1
+        for i in range(count):
+            yield possible_combinations[(start + i * step) % count]
+
+    def widening_limit(self):
+        return ceil(WIDENING_C * (self._number_of_visits + 1) ** WIDENING_ALPHA)
+
+    @property
+    def is_fully_expanded(self):
+        # _untried is set to False once every child has been created
+        return self._untried is False
+
     def expand(self):
-        if len(self.children) == 0:
-            # get the team size information from Agent
-            number_of_players = self.number_of_players
-            player_list = self.player_list
-            mission_size_this_game = Agent.mission_sizes[number_of_players]
-            mission_size = mission_size_this_game[self.round_index]
-            # possible_combinations is a list of tuples containing all possible combinations of team
-            possible_combinations = list(
-                combinations(player_list, mission_size))
-            # put the state of 2 possible outcomes, 2 possible vote: fail and success, True and False, with possible comb of team into children list
-            for combination in possible_combinations:
-                possible_team = list(combination)
-                child_round_index = self.round_index + 1
-                child_node_success_T = MCT_Resistance_Node(possible_team, True, child_round_index, self.missions_failed,
-                                                           True, number_of_players, player_list, parent=self)
-                child_node_success_F = MCT_Resistance_Node(possible_team, True, child_round_index, self.missions_failed,
-                                                           False, number_of_players, player_list, parent=self)
-                child_node_fail_T = MCT_Resistance_Node(possible_team, False, child_round_index, self.missions_failed+1,
-                                                        True, number_of_players, player_list, parent=self)
-                child_node_fail_F = MCT_Resistance_Node(possible_team, False, child_round_index, self.missions_failed+1,
-                                                        False, number_of_players, player_list, parent=self)
-                self.children.append(child_node_fail_T)
-                self.children.append(child_node_fail_F)
-                self.children.append(child_node_success_T)
-                self.children.append(child_node_success_F)
-        else:
-            pass
+        # creates the children allowed by progressive widening for the visits so far,
+        # so a node only holds as many children as the search has spent on it.
+        # The 4 children of a team are created together, so both outcomes of a choice always exist
+        if self._untried is None:
+            self._untried = self.untried_teams()
+            self._index = {}
+        limit = self.widening_limit()
+        while self._untried and len(self.children) < limit:
+            team = next(self._untried, None)
+            if team is None:
+                self._untried = False
+                break
+            for outcome, vote in CHILD_ORDER:
+                child = MCT_Resistance_Node(team, outcome, self.round_index + 1,
+                                            self.missions_failed + (not outcome), vote,
+                                            self.number_of_players, self.player_list, parent=self)
+                self.children.append(child)
+                self._index[team, outcome, vote] = child
+
+    def child(self, team, outcome, vote):
+        # returns the child for the mission of team, its outcome and my vote, None if it was never created
+        if self._index is None:
+            return None
+        return self._index.get((to_mask(team), outcome, vote))
+
+    def detach(self):
+        # makes this node the root of its own tree, keeping its statistics and its subtree,
+        # and letting the rest of the tree go
+        self.parent = None
+
+    def choices(self):
+        # yields (failed child, succeeded child) for every choice of team and vote of this node
+        children = self.children
+        for i in range(0, len(children), 4):
+            yield children[i], children[i + 2]
+            yield children[i + 1], children[i + 3]
+
+    def select_child(self, rollout, world):
+        # picks the choice of team and vote by UCT on the visits of both its outcomes,
+        # trying every choice once first, then lets the simulated world decide the outcome
+        best = None
+        best_weight = -1.
+        log_n = log(self._number_of_visits) if self._number_of_visits else 0.
+        for choice in self.choices():
+            failed, succeeded = choice
+            n = failed._number_of_visits + succeeded._number_of_visits
+            if n == 0:
+                best = choice
+                break
+            weight = (failed._resistance_wins + succeeded._resistance_wins) / n + UCT_C * sqrt(log_n / n)
+            if weight > best_weight:
+                best, best_weight = choice, weight
+        failed, succeeded = best
+        if rollout.mission_fails(world, failed.team_mask, self.round_index + 1, self.number_of_players):
+            return failed
+        return succeeded
 
     def backpropagate(self, result):
-        self._number_of_visits += 1.
-        if result == True:
-            self._resistance_wins += 1
-        if self.parent:
-            self.parent.backpropagate(result)
+        node = self
+        while node is not None:
+            node._number_of_visits += 1.
+            if result == True:
+                node._resistance_wins += 1
+            node = node.parent
 
-    # return the child of current node with the highest weights
+    # return a child of the most visited choice of team and vote of current node,
+    # ties broken by the win rate of the choice; choices never visited are left out,
+    # None if no choice is left.
+    # teams_failed are bitmasks
 
     def best_child(self, teams_failed):
-        c_param = 2
-
         choices_weights = []
-        for c in self.children:
+        for failed, succeeded in self.choices():
+            n = failed.n + succeeded.n
+            if n == 0:
+                continue
             team_has_failed = False
             for team in teams_failed:
-                if set(c.get_team) <= set(team):
+                if is_subset(failed.team_mask, team):
                     team_has_failed = True
                     break
 
             if team_has_failed == False:
-                weight = (c.q / c.n) + c_param * \
-                    np.sqrt((2 * np.log(self.n) / c.n))
-                choices_weights.append(weight)
+                weight = (n, (failed.q + succeeded.q) / n)
+                choices_weights.append((weight, succeeded if succeeded.n >= failed.n else failed))
 
-        index_of_best = np.argmax(choices_weights)
-        return self.children[index_of_best]
+        if not choices_weights:
+            return None
+        return max(choices_weights, key=lambda choice: choice[0])[1]
 
     @property
     def get_team(self):
         return self.team
 
 
+class RandomRollout(object):
+
+    def __init__(self, betray=1.0, resistance=()):
+        """
+        Rollout policy playing the rest of a game from a node in a simulated world
+        Parameters
+        ----------
+        betray: probability for a spy on a mission to betray it
+        resistance: players known to be resistance, never dealt as spies
+        The players of a game are 0 to number_of_players - 1, teams and spies are bitmasks (see teams)
+        missions: (team, betrayals) of the missions played, see observe
+        worlds: the sets of spies agreeing with resistance and missions, None until the next deal
+        """
+        self.betray = betray
+        self.resistance = set(resistance)
+        self.missions = []
+        self.worlds = None
+
+    def observe(self, team, betrayals):
+        # records a mission played, so that only the worlds with at least betrayals spies on team are dealt
+        self.missions.append((to_mask(team), betrayals))
+        self.worlds = None
+
+    def deal(self, node):
+        # the world of an iteration of the search: a random set of spies, as a bitmask,
+        # among those which could have betrayed the missions played
+        if self.worlds is None:
+            candidates = [p for p in node.player_list if p not in self.resistance]
+            every = [to_mask(spies) for spies in combinations(candidates, Agent.spy_count[node.number_of_players])]
+            self.worlds = [spies for spies in every
+                           if all(team_size(team & spies) >= betrayals for team, betrayals in self.missions)]
+            if not self.worlds:
+                # the missions contradict the known resistance, deal every world
+                self.worlds = every
+        return random.choice(self.worlds)
+
+    def mission_fails(self, spies, team, mission_index, number_of_players):
+        spies_on_team = team & spies
+        if self.betray >= 1:
+            betrayals = team_size(spies_on_team)
+        else:
+            betrayals = sum(1 for p in from_mask(spies_on_team) if random.random() < self.betray)
+        return betrayals >= Agent.fails_required[number_of_players][mission_index]
+
+    # result: -True if the resistance won the game
+    #         -False if the spies won the game
+    def play(self, spies, node):
+        missions_failed = node.missions_failed
+        missions_succeeded = node.round_index + 1 - missions_failed
+        mission_size = Agent.mission_sizes[node.number_of_players]
+        mission_index = node.round_index + 1
+        while missions_failed < 3 and missions_succeeded < 3:
+            team = random.choice(TEAMS[node.number_of_players, mission_size[mission_index]])
+            if self.mission_fails(spies, team, mission_index, node.number_of_players):
+                missions_failed += 1
+            else:
+                missions_succeeded += 1
+            mission_index += 1
+        return missions_succeeded >= 3
+
+
+def choice_stats(node):
+    # returns {(team bitmask, vote): [visits, resistance wins]} of the choices of a node,
+    # from its children in the groups of 4 of CHILD_ORDER (the children of any tree backend)
+    children = node.children
+    stats = {}
+    for i in range(0, len(children), 4):
+        for failed, succeeded in ((children[i], children[i + 2]), (children[i + 1], children[i + 3])):
+            stats[failed.team_mask, failed.vote] = [failed.n + succeeded.n, failed.q + succeeded.q]
+    return stats
+
+
+def search_root(state, rollout, iterations, seed):
+    # runs a search from a new root of state in a worker process of a root parallel search,
+    # and returns the statistics of the choices of the root
+    random.seed(seed)
+    root = MCT_Resistance_Node(*state)
+    MCTSearch(root, rollout).run(iterations)
+    return choice_stats(root)
+
+
+def executor(workers):
+    # returns the process pool running the searches of the workers other than the calling process
+    if workers not in _EXECUTORS:
+        from concurrent.futures import ProcessPoolExecutor
+        _EXECUTORS[workers] = ProcessPoolExecutor(max_workers=workers - 1)
+    return _EXECUTORS[workers]
+
+
+def shutdown():
+    """
+    stops the worker processes of the root parallel searches, which are otherwise kept
+    for the next searches; a later parallel search starts new ones
+    """
+    while _EXECUTORS:
+        _, pool = _EXECUTORS.popitem()
+        pool.shutdown()
+
+
+atexit.register(shutdown)
+
+
 class MCTSearch(object):
 
-    def __init__(self, node):
+    def __init__(self, node, rollout=None, workers=1):
         """
         MonteCarloTreeSearch
         Parameters
         ----------
         node : nodes.MCT_Resistance_Node
+        rollout : rollout policy, with the methods of RandomRollout, a RandomRollout() by default
+        workers : number of processes searching at once (root parallelism): every other process
+                  searches a tree of its own from the state of node, and the visits of the choices
+                  of every root are added up to pick the best action. Processes cannot be started
+                  from a daemonic process, such as a worker of tournament.
+                  The workers - 1 processes are started (forked, on Linux) by the first search
+                  with this many workers and kept for the next ones, until shutdown() is called
+                  or the interpreter exits.
         """
         self.root = node
+        self.rollout = rollout if rollout is not None else RandomRollout()
+        self.workers = workers
 
-    def best_action(self, teams_failed):
+    def best_action(self, teams_failed, iterations=ITERATIONS):
         """
         Parameters
         ----------
-        teams_failed: the combinations of team that has failed before, 
+        teams_failed: the bitmasks of the teams that have failed before,
                         updated each time calling this function
+        iterations: the iterations of the search, in every process
         Returns
-            best_child: best node to go to I for current state
+            best_child: best node to go to I for current state, a random team of the next mission
+                        when every visited choice is a failed team (e.g. few visits widened few teams)
 
         -------
         """
-        for _ in range(0, 10000):
-            v = self._tree_policy()
-            reward = v.rollout()
-            v.backpropagate(reward)
+        if self.workers > 1:
+            return self._parallel_best_action(teams_failed, iterations)
+        self.run(iterations)
         # to select best child go for exploitation only
         best_child = self.root.best_child(teams_failed)
+        if best_child is None:
+            return self._random_child(teams_failed)
         return best_child
 
-    def _tree_policy(self):
+    def _random_child(self, teams_failed):
+        # a new child of the root for a random team of the next mission, one that is not part
+        # of a failed team if there is any, and a vote for it
+        root = self.root
+        teams = TEAMS[root.number_of_players, Agent.mission_sizes[root.number_of_players][root.round_index + 1]]
+        allowed = [team for team in teams if not any(is_subset(team, failed) for failed in teams_failed)]
+        return MCT_Resistance_Node(random.choice(allowed or teams), True, root.round_index + 1, root.missions_failed,
+                                   True, root.number_of_players, root.player_list, parent=None)
+
+    def _parallel_best_action(self, teams_failed, iterations):
+        root = self.root
+        state = (root.team_mask, root.outcome, root.round_index, root.missions_failed, root.vote,
+                 root.number_of_players, root.player_list)
+        pool = executor(self.workers)
+        futures = [pool.submit(search_root, state, self.rollout, iterations, random.getrandbits(64))
+                   for _ in range(self.workers - 1)]
+        # this process searches its own tree meanwhile, which is kept for the next rounds
+        self.run(iterations)
+        stats = choice_stats(root)
+        for future in futures:
+            for choice, (n, q) in future.result().items():
+                total = stats.setdefault(choice, [0, 0])
+                total[0] += n
+                total[1] += q
+        # the most visited choice of every tree, ties broken by its win rate, as in best_child
+        choices_weights = []
+        for (team, vote), (n, q) in stats.items():
+            if n == 0 or any(is_subset(team, failed) for failed in teams_failed):
+                continue
+            choices_weights.append(((n, q / n), (team, vote)))
+        if not choices_weights:
+            return self._random_child(teams_failed)
+        team, vote = max(choices_weights, key=lambda choice: choice[0])[1]
+        matching = [c for c in root.children if c.team_mask == team and c.vote == vote]
+        if matching:
+            return max(matching, key=lambda c: c.n)
+        # a choice this process never widened to
+        return MCT_Resistance_Node(team, True, root.round_index + 1, root.missions_failed, vote,
+                                   root.number_of_players, root.player_list, parent=None)
+
+    def run(self, iterations):
+        """
+        runs iterations of the search from the root
         """
-        selects node to run rollout/playout for
+        for _ in range(0, iterations):
+            world = self.rollout.deal(self.root)
+            v = self._tree_policy(world)
+            if v.is_terminal_node:
+                reward = v.rollout()
+            else:
+                reward = self.rollout.play(world, v)
+            v.backpropagate(reward)
+
+    def _tree_policy(self, world):
+        """
+        selects node to run rollout/playout for: descends by UCT
+        until a node never visited, or the end of the game
+        Parameters
+        ----------
+        world : the simulated world of this iteration, from self.rollout.deal
         Returns
         -------
         """
         current_node = self.root
         while not current_node.is_terminal_node:
             current_node.expand()
-            child_index = random.randrange(len(current_node.children))
-            current_node = current_node.children[child_index]
+            current_node = current_node.select_child(self.rollout, world)
+            if current_node.n == 0:
+                break
         return current_node
@@ -1,66 +1,87 @@
-from random import random
-from random_agent import RandomAgent
-from Against import Game
-# from game import Game
-from MCT_agent import MCTAgent
-from improved_Bounder import Bounder
-from Grader import Grader
+'''
+Plays a table of agents and reports the results of one of them.
 
-'''4 Bounder spies with 6 random resistance'''
+    python MCT [--table RandomAgent RandomAgent Bounder*3] [--games 1000] [--engine against] [--seat 4]
+    python MCT --table Grader Bounder RandomAgent*3 --engine game --compare 0 1
 
+Agents and engines are given by name (see registry.py) and only the modules
+of those used are imported.
+'''
+import argparse
+import sys
+from agent import Agent
+from registry import AGENTS, ENGINES, RUNNERS, agent_class, can_spy, engine, run_engine
 
-i = 0
-spy_wins = 0
-res_wins = 0
-beginer_win_as_spy = 0
-beginer_win_as_res = 0
-beginer_index = 0
-while i < 1000:
+# the default table: 2 RandomAgent spies with 3 Bounder resistance
+TABLE = ['RandomAgent', 'RandomAgent', 'Bounder*3']
+# the agent followed in the report
+beginer_index = 4
 
-    agents = [
-        # GreedyAgent(name='g1'),
-        # GreedyAgent(name='g2'),
-        RandomAgent(name='r1'),
-        RandomAgent(name='r2'),
-        # RandomAgent(name='r2'),
-        # RandomAgent(name='r2'),
-        Bounder(name='B1'),
-        Bounder(name='B1'),
-        Bounder(name='B1'),
-        # Bounder(name='B1'),
-        # Bounder(name='B2'),
-        # Bounder(name='B3'),
-        # Grader(name='G1'),
-        # Grader(name='G2'),
-        # Grader(name='G3'),
-        # MCTAgent(name='m1'),
-        # MCTAgent(name='m2'),
-        # MCTAgent(name='m3'),
-        # MCTAgent(name='m1'),
-        # MCTAgent(name='m2'),
-        # MCTAgent(name='m3'),
 
-    ]
-    beginer = agents[4]
+def parse_table(entries):
+    '''
+    expands table entries (agent names, or name*count) into a list of agent names
+    '''
+    names = []
+    for entry in entries:
+        name, _, count = entry.partition('*')
+        if name not in AGENTS:
+            raise ValueError('unknown agent %s, expected one of %s' % (name, ', '.join(AGENTS)))
+        names.extend([name] * int(count or 1))
+    return names
 
-    game = Game(agents)
-    game.play()
-    beginer_index = beginer.player_number
-    if game.missions_lost >= 3:
-        spy_wins += 1
-        if beginer_index in game.spies:
-            beginer_win_as_spy += 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='MCT', description='Play games of The Resistance between agents.')
+    parser.add_argument('--table', nargs='+', default=TABLE, metavar='AGENT',
+                        help='agents in table order, NAME or NAME*COUNT, from: ' + ', '.join(AGENTS))
+    parser.add_argument('--games', type=int, default=1000)
+    engines = {**ENGINES, **RUNNERS}
+    parser.add_argument('--engine', default='against', choices=list(engines),
+                        help='; '.join('%s: %s' % (name, e[2]) for name, e in engines.items()))
+    parser.add_argument('--seat', type=int, default=beginer_index, help='table index of the agent reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per core)')
+    parser.add_argument('--store', help='results_store directory to append every game to')
+    parser.add_argument('--precision', type=float,
+                        help='stop once every win rate is known to +- this (at most --games games)')
+    parser.add_argument('--compare', type=int, nargs=2, metavar=('A', 'B'),
+                        help='stop once agents A and B have significantly different win rates')
+    args = parser.parse_args(argv)
+
+    try:
+        names = parse_table(args.table)
+    except ValueError as e:
+        parser.error(str(e))
+    if len(names) not in Agent.spy_count:
+        parser.error('the table has %d agents, it needs 5-10' % len(names))
+    if not 0 <= args.seat < len(names):
+        parser.error('--seat must be a table index')
+    for index, name in enumerate(names):
+        if not can_spy(name) and (args.engine != 'against' or index < Agent.spy_count[len(names)]):
+            parser.error('%s cannot play as a spy: use --engine against and a seat after the spies' % name)
+    if args.engine in RUNNERS and (args.precision is not None or args.compare is not None or args.store):
+        parser.error('--engine %s plays whole runs: --precision, --compare and --store need another engine'
+                     % args.engine)
+
+    from tournament import report, report_sequential, run, run_sequential
+    table = [(agent_class(name), name + str(index)) for index, name in enumerate(names)]
+    if args.engine in RUNNERS:
+        try:
+            tally = run_engine(args.engine, table, args.games, args.seed, args.workers)
+        except ValueError as e:
+            parser.error(str(e))
+        report(tally, args.seat)
+        return
+    game_class = engine(args.engine)
+    if args.precision is not None or args.compare is not None:
+        tally = run_sequential(table, game_class, args.precision, args.compare, max_games=args.games,
+                               seed=args.seed, workers=args.workers)
+        report_sequential(tally, table)
     else:
-        res_wins += 1
-        if beginer_index not in game.spies:
-            beginer_win_as_res += 1
-    i += 1
-beginer_wins = beginer_win_as_spy + beginer_win_as_res
+        tally = run(table, game_class, args.games, args.seed, args.workers, store=args.store)
+        report(tally, args.seat)
 
 
-# print(game)
-print('spy  wins: ', spy_wins)
-print('res wins: ', res_wins)
-print('When as res: ', beginer_win_as_res)
-print('When as spy: ', beginer_win_as_spy)
-print('total win times: ', beginer_wins)
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,438 @@
+'''
+Agents hosted in a pool of worker processes.
+A crash or a long search in one agent no longer stops the engine's process,
+and agents in different workers can think at the same time (with async_game.py).
+
+The engine and each worker share a block of memory holding one request frame and one response
+frame, and a pair of semaphores to hand them over, so a round trip copies a few bytes
+rather than pickling the call. A frame holds many calls: the informative callbacks
+(new_game and the *_outcome broadcasts) are queued and go with the next request to the worker,
+and with async_game the votes (or betrayals) of all the agents of a worker go in a single frame.
+
+Request frame: u2 number of calls, then per call
+    u2 agent slot in the worker, u1 method (index in METHODS), u1 number of arguments, arguments
+Response frame: u1 status (0 ok, 1 error), then the u2 number of results and the results
+    of the calls with a result, in order, or a u2 length and the UTF-8 error message
+Values: u1 tag, then nothing (None, False, True), an i4 (int), or a u1 length and u1 items (list)
+
+    python agent_pool.py [--workers 2] [--games 1000]
+'''
+import argparse
+import asyncio
+import multiprocessing
+import random
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from agent import Agent
+from callbacks import METHODS
+
+# callbacks whose result the engine needs
+REQUESTS = frozenset(METHODS.index(method) for method in ('propose_mission', 'vote', 'betray'))
+# control call seeding the random module of a worker
+SEED = 255
+FRAME_SIZE = 1 << 16
+NONE, FALSE, TRUE, INT, LIST = range(5)
+
+U1 = struct.Struct('<B')
+U2 = struct.Struct('<H')
+I4 = struct.Struct('<i')
+CALL = struct.Struct('<HBB')
+
+
+class WorkerError(Exception):
+    '''
+    raised in the engine when an agent raised in its worker, or the worker died
+    '''
+
+
+def encode_value(out, value):
+    '''
+    appends a value (None, a bool, an int or a list of agent indexes) to the bytearray out
+    '''
+    if value is None:
+        out.append(NONE)
+    elif value is True or value is False:
+        out.append(TRUE if value else FALSE)
+    elif isinstance(value, (list, tuple)):
+        out.append(LIST)
+        out.append(len(value))
+        out.extend(int(item) for item in value)
+    else:
+        out.append(INT)
+        out.extend(I4.pack(int(value)))
+
+
+def decode_value(data, offset):
+    '''
+    returns the value at offset in data, and the offset after it
+    '''
+    tag = data[offset]
+    offset += 1
+    if tag == NONE:
+        return None, offset
+    if tag == FALSE or tag == TRUE:
+        return tag == TRUE, offset
+    if tag == INT:
+        return I4.unpack_from(data, offset)[0], offset + 4
+    length = data[offset]
+    return list(data[offset + 1:offset + 1 + length]), offset + 1 + length
+
+
+def encode_call(out, slot, method, args):
+    '''
+    appends a call to the bytearray out
+    '''
+    out.extend(CALL.pack(slot, method, len(args)))
+    for arg in args:
+        encode_value(out, arg)
+
+
+def serve(memory_name, request_ready, response_ready, specs):
+    '''
+    the main loop of a worker process: builds the agents of specs ((class, name) pairs)
+    and answers request frames until it gets an empty one
+    '''
+    memory = shared_memory.SharedMemory(memory_name)
+    buffer = memory.buf
+    agents = [agent_class(name) for agent_class, name in specs]
+    methods = [[getattr(agent, method) for method in METHODS] for agent in agents]
+    try:
+        while True:
+            request_ready.acquire()
+            count = U2.unpack_from(buffer, 0)[0]
+            if count == 0:
+                return
+            out = bytearray(b'\x00\x00\x00')
+            results = 0
+            offset = 2
+            try:
+                for _ in range(count):
+                    # None until the header of the call is decoded
+                    slot = None
+                    slot, method, nargs = CALL.unpack_from(buffer, offset)
+                    offset += CALL.size
+                    args = []
+                    for _ in range(nargs):
+                        value, offset = decode_value(buffer, offset)
+                        args.append(value)
+                    if method == SEED:
+                        random.seed(args[0])
+                        continue
+                    result = methods[slot][method](*args)
+                    if method in REQUESTS:
+                        encode_value(out, result)
+                        results += 1
+                U2.pack_into(out, 1, results)
+            except Exception as e:
+                message = '%s: %s' % (type(e).__name__, e)
+                if slot is not None and 0 <= slot < len(agents):
+                    message = '%s: %s' % (agents[slot], message)
+                message = message.encode()[:FRAME_SIZE - 3]
+                out = bytearray(U1.pack(1) + U2.pack(len(message)) + message)
+            buffer[FRAME_SIZE:FRAME_SIZE + len(out)] = out
+            response_ready.release()
+    finally:
+        del buffer
+        memory.close()
+
+
+class Channel:
+    '''
+    the engine's side of a worker: queues calls and sends them in frames.
+    With an executor, the channel serves async_game: its frames are sent by flush,
+    on a thread of the executor, and the results resolve the futures of request_async.
+    '''
+
+    def __init__(self, specs, context, executor=None):
+        self.memory = shared_memory.SharedMemory(create=True, size=2 * FRAME_SIZE)
+        self.request_ready = context.Semaphore(0)
+        self.response_ready = context.Semaphore(0)
+        self.process = context.Process(target=serve, daemon=True,
+                                       args=(self.memory.name, self.request_ready, self.response_ready, specs))
+        self.process.start()
+        self.pending = bytearray()
+        self.calls = 0
+        self.executor = executor
+        # futures of the results of the queued calls, for async_game
+        self.futures = []
+        # (frame, futures of its results) of the full frames waiting for flush
+        self.sealed = []
+        self.flushing = None
+
+    def queue(self, slot, method, args):
+        '''
+        queues a call, sending the queue first if the frame would be full.
+        For async_game the full frame is set aside, with the futures of its results, for flush.
+        '''
+        if len(self.pending) > FRAME_SIZE // 2:
+            if self.executor is None:
+                # only informative calls are queued between the requests of game.Game, without results
+                self.exchange(self.take())
+            else:
+                self.sealed.append((self.take(), self.futures))
+                self.futures = []
+                if self.flushing is None:
+                    self.flushing = asyncio.ensure_future(self.flush())
+        encode_call(self.pending, slot, method, args)
+        self.calls += 1
+
+    def take(self):
+        '''
+        returns the frame of the queued calls, emptying the queue
+        '''
+        frame = U2.pack(self.calls) + self.pending
+        self.pending = bytearray()
+        self.calls = 0
+        return frame
+
+    def round_trip(self):
+        '''
+        sends the queued calls and returns the results of those with a result
+        '''
+        if self.calls == 0:
+            return []
+        return self.exchange(self.take())
+
+    def exchange(self, frame):
+        '''
+        sends a request frame to the worker and returns the results of its response
+        '''
+        self.memory.buf[:len(frame)] = frame
+        self.request_ready.release()
+        while not self.response_ready.acquire(timeout=0.5):
+            if not self.process.is_alive():
+                raise WorkerError('worker %d died' % self.process.pid)
+        buffer = self.memory.buf
+        if buffer[FRAME_SIZE] == 1:
+            length = U2.unpack_from(buffer, FRAME_SIZE + 1)[0]
+            raise WorkerError(bytes(buffer[FRAME_SIZE + 3:FRAME_SIZE + 3 + length]).decode())
+        count = U2.unpack_from(buffer, FRAME_SIZE + 1)[0]
+        offset = FRAME_SIZE + 3
+        results = []
+        for _ in range(count):
+            value, offset = decode_value(buffer, offset)
+            results.append(value)
+        return results
+
+    def request(self, slot, method, args):
+        '''
+        sends the queued calls and this one, and returns its result
+        '''
+        self.queue(slot, method, args)
+        return self.round_trip()[-1]
+
+    async def request_async(self, slot, method, args):
+        '''
+        queues a call and returns its result once the queue, with the calls
+        made at the same time by the other agents of the worker, has been sent
+        '''
+        self.queue(slot, method, args)
+        result = asyncio.get_running_loop().create_future()
+        self.futures.append(result)
+        if self.flushing is None:
+            self.flushing = asyncio.ensure_future(self.flush())
+        return await result
+
+    async def flush(self):
+        '''
+        sends the full frames and the queue once the calls made at the same time have joined it,
+        waiting for each response on a thread so that the other workers are served meanwhile.
+        The results of a frame resolve the futures of the calls of that frame.
+        '''
+        await asyncio.sleep(0)
+        if self.calls:
+            self.sealed.append((self.take(), self.futures))
+            self.futures = []
+        frames, self.sealed = self.sealed, []
+        try:
+            for frame, futures in frames:
+                try:
+                    results = await asyncio.get_running_loop().run_in_executor(self.executor, self.exchange, frame)
+                except Exception as e:
+                    for future in futures:
+                        future.set_exception(e)
+                else:
+                    for future, result in zip(futures, results):
+                        future.set_result(result)
+        finally:
+            self.flushing = None
+            if self.sealed or self.futures:
+                self.flushing = asyncio.ensure_future(self.flush())
+
+    def close(self):
+        '''
+        stops the worker and frees the shared memory
+        '''
+        if self.process.is_alive():
+            self.memory.buf[:2] = U2.pack(0)
+            self.request_ready.release()
+            self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.memory.close()
+        self.memory.unlink()
+
+
+class ProxyAgent(Agent):
+    '''
+    stands in the engine for an agent hosted by a worker
+    '''
+
+    def __init__(self, name, channel, slot):
+        self.name = name
+        self.channel = channel
+        self.slot = slot
+
+    def notify(self, method, *args):
+        self.channel.queue(self.slot, METHODS.index(method), args)
+
+    def request(self, method, *args):
+        return self.channel.request(self.slot, METHODS.index(method), args)
+
+    def new_game(self, number_of_players, player_number, spies):
+        self.notify('new_game', number_of_players, player_number, spies)
+
+    def propose_mission(self, team_size, fails_required=1):
+        return self.request('propose_mission', team_size, fails_required)
+
+    def vote(self, mission, proposer):
+        return self.request('vote', mission, proposer)
+
+    def vote_outcome(self, mission, proposer, votes):
+        self.notify('vote_outcome', mission, proposer, votes)
+
+    def betray(self, mission, proposer):
+        return self.request('betray', mission, proposer)
+
+    def mission_outcome(self, mission, proposer, num_fails, mission_success):
+        self.notify('mission_outcome', mission, proposer, num_fails, mission_success)
+
+    def round_outcome(self, rounds_complete, missions_failed):
+        self.notify('round_outcome', rounds_complete, missions_failed)
+
+    def game_outcome(self, spies_win, spies):
+        self.notify('game_outcome', spies_win, spies)
+
+
+class AsyncProxyAgent(ProxyAgent):
+    '''
+    a ProxyAgent for async_game.py, whose requests are coroutines
+    '''
+
+    async def propose_mission(self, team_size, fails_required=1):
+        return await self.channel.request_async(self.slot, METHODS.index('propose_mission'),
+                                                (team_size, fails_required))
+
+    async def vote(self, mission, proposer):
+        return await self.channel.request_async(self.slot, METHODS.index('vote'), (mission, proposer))
+
+    async def betray(self, mission, proposer):
+        return await self.channel.request_async(self.slot, METHODS.index('betray'), (mission, proposer))
+
+
+class AgentPool:
+    '''
+    hosts the agents of a table ((class, name) pairs) in workers worker processes,
+    dealt round robin. agents are their ProxyAgents, in table order, for game.Game,
+    or AsyncProxyAgents for async_game.Game if asynchronous is True.
+    The agents persist from game to game, as they would in a tournament over the network.
+    '''
+
+    def __init__(self, table, workers=None, asynchronous=False):
+        workers = min(workers or multiprocessing.cpu_count(), len(table))
+        context = multiprocessing.get_context()
+        specs = [table[i::workers] for i in range(workers)]
+        self.executor = ThreadPoolExecutor(workers) if asynchronous else None
+        self.channels = [Channel(spec, context, self.executor) for spec in specs]
+        self.agents = []
+        for index, (_, name) in enumerate(table):
+            channel, slot = self.channels[index % workers], index // workers
+            if asynchronous:
+                self.agents.append(AsyncProxyAgent(name, channel, slot))
+            else:
+                self.agents.append(ProxyAgent(name, channel, slot))
+
+    def seed(self, seed):
+        '''
+        seeds the random module of worker i with seed+i
+        '''
+        for i, channel in enumerate(self.channels):
+            channel.queue(0, SEED, (seed + i,))
+            channel.round_trip()
+
+    def close(self):
+        '''
+        stops the workers
+        '''
+        for channel in self.channels:
+            channel.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run(table, game_class, games, seed=0, workers=None):
+    '''
+    plays games games of the table, hosted by an AgentPool, and returns their tally (see tournament.py).
+    game_class is a game.Game or an async_game.Game class.
+    '''
+    from tournament import new_tally, record
+    import async_game
+    asynchronous = issubclass(game_class, async_game.Game)
+    tally = new_tally(len(table))
+    random.seed(seed)
+
+    async def play_all(agents):
+        for _ in range(games):
+            game = game_class(agents, False)
+            await game.play()
+            record(tally, agents, game)
+
+    with AgentPool(table, workers, asynchronous) as pool:
+        pool.seed(seed)
+        if asynchronous:
+            asyncio.run(play_all(pool.agents))
+        else:
+            for _ in range(games):
+                game = game_class(pool.agents, False)
+                game.play()
+                record(tally, pool.agents, game)
+    return tally
+
+
+def run_table(table, games, seed=0, workers=None):
+    '''
+    plays games games of the table with game.Game, hosted by an AgentPool, and returns their tally
+    '''
+    import game
+    return run(table, game.Game, games, seed, workers)
+
+
+def main():
+    import time
+    import game
+    import async_game
+    from improved_Bounder import Bounder
+    from tournament import report
+    parser = argparse.ArgumentParser(description='Play Bounders hosted in worker processes.')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--asynchronous', action='store_true', help='play with async_game.py')
+    args = parser.parse_args()
+
+    table = [(Bounder, 'B%d' % i) for i in range(5)]
+    start = time.perf_counter()
+    tally = run(table, async_game.Game if args.asynchronous else game.Game, args.games, workers=args.workers)
+    seconds = time.perf_counter() - start
+    report(tally, 0)
+    print('%d games in %.2f s: %.1f games/s' % (args.games, seconds, args.games / seconds))
+
+
+if __name__ == '__main__':
+    main()
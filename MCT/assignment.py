@@ -0,0 +1,101 @@
+'''
+Strategies choosing the seating and the spies of a game.
+An assignment is called with the number of players and returns (order, spies):
+order[seat] is the index in the table of the agent sitting in that seat,
+and spies is the list of the seats of the spies.
+'''
+from agent import Agent
+from itertools import combinations
+from math import factorial
+import random
+
+
+def random_assignment(num_players):
+    '''
+    shuffles the table and draws the spies at random (the behaviour of game.Game)
+    '''
+    order = list(range(num_players))
+    random.shuffle(order)
+    spies = []
+    while len(spies) < Agent.spy_count[num_players]:
+        spy = random.randrange(num_players)
+        if spy not in spies:
+            spies.append(spy)
+    return order, spies
+
+
+def fixed_assignment(num_players):
+    '''
+    keeps the table order and makes agents 0..k-1 the spies (the behaviour of Against.Game)
+    '''
+    return list(range(num_players)), list(range(Agent.spy_count[num_players]))
+
+
+class StratumAssignment:
+    '''
+    makes the agents at the given table indexes the spies,
+    and seats the table at random (or in table order if shuffle is False)
+    '''
+
+    def __init__(self, spy_agents, shuffle=True):
+        self.spy_agents = tuple(spy_agents)
+        self.shuffle = shuffle
+
+    def __call__(self, num_players):
+        order = list(range(num_players))
+        if self.shuffle:
+            random.shuffle(order)
+        spies = [seat for seat, agent in enumerate(order) if agent in self.spy_agents]
+        return order, spies
+
+
+class FixedAssignment:
+    '''
+    always returns the same seating and spies
+    '''
+
+    def __init__(self, order, spies):
+        self.order = tuple(order)
+        self.spies = tuple(spies)
+
+    def __call__(self, num_players):
+        return list(self.order), list(self.spies)
+
+
+def spy_sets(num_players):
+    '''
+    returns every possible set of spies, as tuples of table indexes.
+    Random assignment makes each of these C(n, k) sets equally likely.
+    '''
+    return list(combinations(range(num_players), Agent.spy_count[num_players]))
+
+
+def nth_seating(num_players, index):
+    '''
+    returns the index-th permutation of range(num_players) in lexicographic order
+    (0 <= index < num_players!)
+    '''
+    left = list(range(num_players))
+    order = []
+    for i in range(num_players - 1, -1, -1):
+        position, index = divmod(index, factorial(i))
+        order.append(left.pop(position))
+    return order
+
+
+class SeatingEnumeration:
+    '''
+    makes the agents at the given table indexes the spies,
+    and returns the seatings of the table one after the other in lexicographic order,
+    starting from the first-th, so that n! calls visit every seating once
+    '''
+
+    def __init__(self, spy_agents, first=0):
+        self.spy_agents = tuple(spy_agents)
+        self.next = first
+
+    def __call__(self, num_players):
+        order = nth_seating(num_players, self.next)
+        self.next += 1
+        spies = [seat for seat, agent in enumerate(order) if agent in self.spy_agents]
+        return order, spies
@@ -0,0 +1,163 @@
+'''
+Asyncio version of game.py, for agents whose callbacks are coroutines
+(remote agents, or agents searching in another thread or process).
+Plain agents work as well, their callbacks are simply called.
+Calls that do not depend on each other are made at once and gathered:
+new_game, the votes on a mission, the betrayals, and every outcome broadcast,
+so a round takes as long as its slowest agent rather than the sum of all of them.
+An agent is never asked two things at once, except a spy listed twice on a team.
+The rules, the history kept and the text of a game are those of game.py.
+'''
+import asyncio
+import inspect
+from agent import Agent
+from assignment import random_assignment
+import game
+from game import build_listeners
+from teams import to_mask
+
+
+async def call(method, *args):
+    '''
+    calls an agent's callback and returns its result, awaiting it if it is a coroutine
+    '''
+    result = method(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def gather(coroutines):
+    '''
+    runs the coroutines at once and returns their results in order.
+    If one raises, the others are cancelled before the exception is passed on.
+    '''
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def broadcast(agents, hook, *args):
+    '''
+    calls hook on every agent at once
+    '''
+    await gather(call(getattr(a, hook), *args) for a in agents)
+
+
+class Game(game.Game):
+    '''
+    A game of The Resistance played with await Game(agents).play().
+    new_game is called at the start of play, rather than by the constructor.
+    '''
+    __slots__ = ()
+
+    def __init__(self, agents, history=True, assignment=random_assignment):
+        '''
+        agents is the list of agents playing the game
+        the list must contain 5-10 agents
+        history and assignment are those of game.Game
+        '''
+        if len(agents)<5 or len(agents)>10:
+            raise Exception('Agent array out of range')
+        self.num_players = len(agents)
+        self.order, self.spies = assignment(self.num_players)
+        self.agents = [agents[i] for i in self.order]
+        self.profiler = None
+        self.watchdog = None
+        self.listeners = build_listeners(self.agents)
+        self.missions_lost = 0
+        self.failed_rounds = 0
+        self.proposals = 0
+        self.rounds = [] if history else None
+
+    async def play(self):
+        await gather(call(self.agents[agent_id].new_game, self.num_players, agent_id,
+                          self.spies.copy() if agent_id in self.spies else [])
+                     for agent_id in range(self.num_players))
+        leader_id = 0
+        for i in range(5):
+            rnd = Round(leader_id, self.agents, self.spies, i, self.rounds is not None, self.listeners)
+            if self.rounds is not None:
+                self.rounds.append(rnd)
+            if not await rnd.play():
+                self.missions_lost += 1
+                self.failed_rounds |= 1 << i
+            self.proposals += rnd.proposals
+            await broadcast(self.listeners['round_outcome'], 'round_outcome', i+1, self.missions_lost)
+            leader_id = (leader_id+rnd.proposals) % len(self.agents)
+        await broadcast(self.listeners['game_outcome'], 'game_outcome', self.missions_lost>2, self.spies)
+
+
+class Round(game.Round):
+    '''
+    a round of an asyncio game
+    '''
+    __slots__ = ()
+
+    async def play(self):
+        '''
+        runs team assignment until a team is approved
+        or five missions are proposed,
+        and returns True is the final mission was successful
+        '''
+        mission_size = Agent.mission_sizes[len(self.agents)][self.rnd]
+        fails_required = Agent.fails_required[len(self.agents)][self.rnd]
+        while self.proposals<5:
+            team = await call(self.agents[self.leader_id].propose_mission, mission_size, fails_required)
+            mission = Mission(self.leader_id, team, self.agents, self.rnd)
+            await mission.run(self.spies, self.proposals==4, self.listeners)
+            self.proposals += 1
+            if self.missions is not None:
+                self.missions.append(mission)
+            self.leader_id = (self.leader_id+1) % len(self.agents)
+            if mission.is_approved():
+                break
+        self.success = mission.is_successful()
+        return self.success
+
+
+class Mission(game.Mission):
+    '''
+    a proposed mission of an asyncio game, which is run by awaiting run
+    '''
+    __slots__ = ()
+
+    def __init__(self, leader_id, team, agents, rnd):
+        '''
+        leader_id is the id of the agent who proposed the mission
+        team is the list of agent indexes on the mission
+        agents is the list of agents in the game,
+        rnd is the round number of the game
+        '''
+        self.leader_id = leader_id
+        self.team = team
+        self.agents = agents
+        self.rnd = rnd
+
+    async def run(self, spies, auto_approve, listeners):
+        '''
+        Runs the mission, by asking every agent to vote at once,
+        and if the vote is in favour,
+        asking the spies on the mission at once if they wish to fail it
+        '''
+        if auto_approve:
+            votes_for = list(range(len(self.agents)))
+        else:
+            votes = await gather(call(a.vote, self.team, self.leader_id) for a in self.agents)
+            votes_for = [i for i, vote in enumerate(votes) if vote]
+        self.votes = to_mask(votes_for)
+        await broadcast(listeners['vote_outcome'], 'vote_outcome', self.team, self.leader_id, votes_for)
+        # fails is None until the mission is approved
+        self.fails = None
+        if 2*len(votes_for) > len(self.agents):
+            betrayals = await gather(call(self.agents[i].betray, self.team, self.leader_id)
+                                     for i in self.team if i in spies)
+            self.fails = sum(1 for betrayal in betrayals if betrayal)
+            success = self.fails < Agent.fails_required[len(self.agents)][self.rnd]
+            await broadcast(listeners['mission_outcome'], 'mission_outcome', self.team, self.leader_id,
+                            self.fails, success)
@@ -0,0 +1,102 @@
+'''
+Vectorized engine for tables made only of RandomAgents.
+A RandomAgent's proposals, votes and betrayals do not depend on the history of the game,
+so instead of building a Game -> Round -> Mission object graph per game,
+a whole batch of games is played at once, one NumPy pass per round.
+The results follow the same distribution as game.Game (or Against.Game with fixed_spies)
+playing a table of RandomAgents.
+'''
+import numpy as np
+from agent import Agent
+from tournament import new_tally, merge
+
+
+def play(num_players, games, rng, fixed_spies=False, betray_rate=1.0):
+    '''
+    plays games games of num_players RandomAgents and returns a dictionary of arrays:
+    seating: (games, num_players) index in the table of the agent in each seat
+    spies: (games, num_players) bool, True for the seats of the spies
+    proposals: (games, 5) number of missions proposed in each round
+    failed: (games, 5) bool, True if the round's mission failed
+    missions_lost: (games,) number of failed missions
+    rng is a numpy.random.Generator,
+    fixed_spies chooses agents 0..k-1 as the spies (as Against.Game does)
+    instead of a random set,
+    betray_rate is the probability that a spy on a mission betrays it
+    (RandomAgent.betray always does).
+    '''
+    n = num_players
+    k = Agent.spy_count[n]
+    spies = np.zeros((games, n), dtype=bool)
+    if fixed_spies:
+        seating = np.broadcast_to(np.arange(n), (games, n))
+        spies[:, :k] = True
+    else:
+        # shuffle the table, then the k seats with the smallest keys are the spies
+        seating = rng.random((games, n)).argsort(axis=1)
+        chosen = rng.random((games, n)).argsort(axis=1)[:, :k]
+        spies[np.arange(games)[:, None], chosen] = True
+    proposals = np.empty((games, 5), dtype=np.int8)
+    failed = np.empty((games, 5), dtype=bool)
+    for rnd in range(5):
+        mission_size = Agent.mission_sizes[n][rnd]
+        fails_required = Agent.fails_required[n][rnd]
+        # the first four proposals are voted on, the fifth is approved without a vote
+        votes_for = (rng.random((games, 4, n)) < 0.5).sum(axis=2)
+        approved = 2 * votes_for > n
+        proposals[:, rnd] = np.where(approved.any(axis=1), approved.argmax(axis=1) + 1, 5)
+        # RandomAgent.propose_mission draws its team from range(team_size),
+        # so whoever leads, the mission is agents 0..mission_size-1
+        betrayals = spies[:, :mission_size] & (rng.random((games, mission_size)) < betray_rate)
+        failed[:, rnd] = betrayals.sum(axis=1) >= fails_required
+    return {
+        'seating': seating,
+        'spies': spies,
+        'proposals': proposals,
+        'failed': failed,
+        'missions_lost': failed.sum(axis=1),
+    }
+
+
+def tally(result):
+    '''
+    converts the arrays returned by play into a tournament tally
+    '''
+    # spies of the table, rather than of the seats
+    spies = np.zeros_like(result['spies'])
+    spies[np.arange(len(spies))[:, None], result['seating']] = result['spies']
+    spies_win = result['missions_lost'] >= 3
+    counts = new_tally(spies.shape[1])
+    counts['games'] = len(spies_win)
+    counts['spy_wins'] = int(spies_win.sum())
+    counts['res_wins'] = counts['games'] - counts['spy_wins']
+    counts['seat_wins_as_spy'] = (spies & spies_win[:, None]).sum(axis=0).tolist()
+    counts['seat_wins_as_res'] = (~spies & ~spies_win[:, None]).sum(axis=0).tolist()
+    wins = (spies == spies_win[:, None]).astype(np.int64)
+    counts['pair_wins'] = (wins.T @ wins).tolist()
+    return counts
+
+
+def run_table(table, games, seed=0, workers=None):
+    '''
+    plays games games of a table of RandomAgents ((class, name) pairs, as for tournament.run)
+    with random seating and spies, and returns their tally.
+    workers is ignored, the games are played in this process.
+    '''
+    from random_agent import RandomAgent
+    if any(agent_class is not RandomAgent for agent_class, _ in table):
+        raise ValueError('the batch engine only plays tables of RandomAgents')
+    return run(len(table), games, seed)
+
+
+def run(num_players, games, seed=0, fixed_spies=False, batch_size=100000):
+    '''
+    plays games games of num_players RandomAgents in batches of batch_size
+    and returns the merged tally, in the same format as tournament.run
+    '''
+    rng = np.random.default_rng(seed)
+    counts = new_tally(num_players)
+    for start in range(0, games, batch_size):
+        result = play(num_players, min(batch_size, games - start), rng, fixed_spies)
+        merge(counts, tally(result))
+    return counts
@@ -0,0 +1,128 @@
+'''
+Throughput benchmark: games per second, and the latency of every agent callback,
+for each agent type at every player count.
+Every run is appended as one JSON line to the output file, so runs can be compared over time.
+
+    python benchmark.py [--agents Bounder Grader] [--players 5 6] [--games 500] [--output benchmark_results.jsonl]
+'''
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+from agent import Agent
+from assignment import fixed_assignment, random_assignment
+from game import Game
+from callbacks import METHODS
+from profiler import Profiler
+from random_agent import RandomAgent
+from registry import AGENTS, agent_class, can_spy
+
+# default number of games per player count
+GAMES = 2000
+# a game of the MCT agents takes seconds
+AGENT_GAMES = {'MCTAgent': 1, 'MCTArrayAgent': 1}
+
+
+def table(name, num_players):
+    '''
+    returns the agents of a benchmark table and the assignment to play it with.
+    Agents that can play as spies fill the table, otherwise the spies are RandomAgents
+    in the first seats and the agent plays the last one.
+    '''
+    cls = agent_class(name)
+    if can_spy(name):
+        return [cls(name + str(i)) for i in range(num_players)], random_assignment
+    agents = [RandomAgent('r' + str(i)) for i in range(num_players - 1)] + [cls(name)]
+    return agents, fixed_assignment
+
+
+def percentile(ordered, fraction):
+    '''
+    returns the value at fraction (0-1) of an ordered list
+    '''
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def benchmark(name, num_players, games, seed=0):
+    '''
+    plays games games of the benchmark table of name twice with the same seeds:
+    once untouched, to measure games per second, then with every callback timed.
+    Returns a dictionary of the results.
+    '''
+    start = time.perf_counter()
+    for i in range(games):
+        random.seed(seed + i)
+        agents, assignment = table(name, num_players)
+        Game(agents, False, assignment).play()
+    seconds = time.perf_counter() - start
+
+    profiler = Profiler(keep_samples=True)
+    for i in range(games):
+        random.seed(seed + i)
+        agents, assignment = table(name, num_players)
+        Game(agents, False, assignment, profiler).play()
+
+    calls = {}
+    for method in METHODS:
+        durations = sorted(profiler.samples.get((agent_class(name).__name__, method), []))
+        calls[method] = {
+            'count': len(durations),
+            'mean_us': sum(durations) / len(durations) / 1000 if durations else None,
+            'p50_us': percentile(durations, 0.5) / 1000 if durations else None,
+            'p99_us': percentile(durations, 0.99) / 1000 if durations else None,
+        }
+    return {
+        'agent': name,
+        'players': num_players,
+        'games': games,
+        'seconds': seconds,
+        'games_per_sec': games / seconds,
+        'calls': calls,
+    }
+
+
+def revision():
+    '''
+    returns the git commit of the working tree, or None outside a repository
+    '''
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the agents and the game engine.')
+    parser.add_argument('--agents', nargs='+', default=list(AGENTS), choices=list(AGENTS))
+    parser.add_argument('--players', nargs='+', type=int, default=sorted(Agent.mission_sizes))
+    parser.add_argument('--games', type=int, help='games per cell (default depends on the agent)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.jsonl')
+    args = parser.parse_args()
+
+    results = []
+    for name in args.agents:
+        for num_players in args.players:
+            result = benchmark(name, num_players, args.games or AGENT_GAMES.get(name, GAMES), args.seed)
+            results.append(result)
+            print('%-12s %2d players: %10.1f games/s' % (name, num_players, result['games_per_sec']))
+            for method, stats in result['calls'].items():
+                if stats['count']:
+                    print('    %-16s %8d calls  p50 %9.2f us  p99 %9.2f us'
+                          % (method, stats['count'], stats['p50_us'], stats['p99_us']))
+    run = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(args.output, 'a') as f:
+        f.write(json.dumps(run) + '\n')
+
+
+if __name__ == '__main__':
+    main()
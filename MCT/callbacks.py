@@ -0,0 +1,43 @@
+'''
+The callbacks of an agent, and the patching of them shared by Profiler and Watchdog:
+a Patcher replaces the callbacks of the agents of a game by wrappers, as instance attributes,
+and gives the agents their own callbacks back at the end of the game.
+'''
+
+METHODS = ('new_game', 'propose_mission', 'vote', 'vote_outcome', 'betray',
+           'mission_outcome', 'round_outcome', 'game_outcome')
+
+
+class Patcher:
+    '''
+    base of the tools wrapping agent callbacks: subclasses define wrap(agent, method),
+    returning the wrapper of agent's bound method, and set self._attached = {} in __init__
+    '''
+
+    def wrap(self, agent, method):
+        raise NotImplementedError
+
+    def attach(self, agents):
+        '''
+        replaces the callbacks of agents by wrappers (an agent listed twice is wrapped once)
+        '''
+        for agent in agents:
+            if id(agent) in self._attached:
+                continue
+            replaced = {method: agent.__dict__.get(method) for method in METHODS if hasattr(agent, method)}
+            for method in replaced:
+                setattr(agent, method, self.wrap(agent, method))
+            # id(agent) -> (agent, its instance attributes replaced)
+            self._attached[id(agent)] = (agent, replaced)
+
+    def detach(self):
+        '''
+        gives the attached agents their own callbacks back
+        '''
+        for agent, replaced in self._attached.values():
+            for method, original in replaced.items():
+                if original is None:
+                    del agent.__dict__[method]
+                else:
+                    setattr(agent, method, original)
+        self._attached = {}
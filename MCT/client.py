@@ -0,0 +1,58 @@
+'''
+Websocket client letting any Agent play the games of a server (see server.py for the protocol).
+The agent's callbacks are called with the arguments the server sends,
+exactly as a local Game would call them.
+
+    python client.py Bounder [--name B1] [--uri ws://localhost:8765] [--games 100]
+'''
+import argparse
+import asyncio
+import json
+import websockets
+from server import REQUESTS
+
+
+async def play(agent, uri, games=None):
+    '''
+    connects agent to the server at uri and plays games games (forever if None),
+    joining the lobby again after each game. Returns the number of games played.
+    '''
+    played = 0
+    async with websockets.connect(uri, compression=None, max_queue=None) as websocket:
+        join = json.dumps({'type': 'join', 'name': agent.name})
+        await websocket.send(join)
+        async for text in websocket:
+            message = json.loads(text)
+            if message['type'] == 'abort':
+                await websocket.send(join)
+                continue
+            method = message['method']
+            value = getattr(agent, method)(*message['args'])
+            if method in REQUESTS:
+                # default=int: agents may answer with NumPy integers
+                await websocket.send(json.dumps({'type': 'result', 'id': message['id'], 'value': value},
+                                                default=int))
+            elif method == 'game_outcome':
+                played += 1
+                if games is not None and played >= games:
+                    break
+                await websocket.send(join)
+    return played
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play the games of a server with an agent.')
+    parser.add_argument('agent', help='agent class, e.g. Bounder')
+    parser.add_argument('--name', help='name of the agent (default: the class name)')
+    parser.add_argument('--uri', default='ws://localhost:8765')
+    parser.add_argument('--games', type=int, help='games to play before leaving (default: until the server stops)')
+    args = parser.parse_args()
+
+    from registry import agent_class
+    agent = agent_class(args.agent)(args.name or args.agent)
+    played = asyncio.run(play(agent, args.uri, args.games))
+    print('%s played %d games' % (agent.name, played))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+'''
+Experiment matrix runner: plays every (agent mix, player count, engine) cell of a spec
+and caches each cell's tally under a hash of its configuration and of the source of every
+module it plays with (the engine, the agents, and the local modules they import).
+Rerunning a spec only plays the cells whose configuration or code changed:
+after an edit to Grader.py, only the cells with a Grader are played again.
+
+A spec is a JSON file:
+    {
+        "mixes": {
+            "random spies": {"spies": ["RandomAgent"], "resistance": ["Bounder"]},
+            "mixed": ["Grader", "Bounder", "RandomAgent"]
+        },
+        "players": [5, 6, 7, 8, 9, 10],
+        "engines": ["against", "game"],
+        "games": 1000,
+        "seed": 0
+    }
+A mix is either a list of agents, repeated to fill the table, or the agents repeated
+to fill the spy seats (the first ones of the table) and the resistance seats.
+
+    python experiments.py spec.json [--cache DIR] [--workers N] [--output results.json]
+'''
+import argparse
+import ast
+import hashlib
+import json
+import os
+from itertools import cycle, islice
+from agent import Agent
+from registry import AGENTS, ENGINES, RUNNERS, agent_class, engine_module, run_engine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE = os.path.join(HERE, '.experiment_cache')
+# bump to invalidate every cached cell when the format of the results changes
+VERSION = 1
+
+
+def local_imports(module, directory=HERE):
+    '''
+    returns the sorted names of module and of the modules of directory it imports, recursively
+    '''
+    seen = set()
+    todo = [module]
+    while todo:
+        name = todo.pop()
+        path = os.path.join(directory, name + '.py')
+        if name in seen or not os.path.exists(path):
+            continue
+        seen.add(name)
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                todo.extend(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                todo.append(node.module.split('.')[0])
+    return sorted(seen)
+
+
+def source_hash(modules, directory=HERE):
+    '''
+    returns the hash of the source of the modules
+    '''
+    digest = hashlib.sha256()
+    for name in modules:
+        with open(os.path.join(directory, name + '.py'), 'rb') as f:
+            digest.update(name.encode() + b'\0' + f.read() + b'\0')
+    return digest.hexdigest()
+
+
+def table_names(mix, num_players):
+    '''
+    returns the agent names of the table of a mix with num_players players
+    '''
+    if isinstance(mix, dict):
+        spies = Agent.spy_count[num_players]
+        return (list(islice(cycle(mix['spies']), spies))
+                + list(islice(cycle(mix['resistance']), num_players - spies)))
+    return list(islice(cycle(mix), num_players))
+
+
+def cells(spec):
+    '''
+    returns the cells of a spec, as dictionaries of (mix, agents, players, engine, games, seed)
+    '''
+    result = []
+    for mix_name, mix in spec['mixes'].items():
+        for num_players in spec['players']:
+            for engine_name in spec['engines']:
+                names = table_names(mix, num_players)
+                for name in names:
+                    if name not in AGENTS:
+                        raise ValueError('unknown agent %s in mix %s' % (name, mix_name))
+                if engine_name not in ENGINES and engine_name not in RUNNERS:
+                    raise ValueError('unknown engine ' + engine_name)
+                result.append({'mix': mix_name, 'agents': names, 'players': num_players,
+                               'engine': engine_name, 'games': spec['games'], 'seed': spec.get('seed', 0)})
+    return result
+
+
+def cell_key(cell):
+    '''
+    returns the cache key of a cell: the hash of its configuration (but not the name of its mix)
+    and of the source of the modules it plays with
+    '''
+    modules = {engine_module(cell['engine']), 'tournament'}
+    modules.update(AGENTS[name][0] for name in cell['agents'])
+    sources = source_hash(sorted(set().union(*(local_imports(module) for module in modules))))
+    config = {key: cell[key] for key in ('agents', 'players', 'engine', 'games', 'seed')}
+    config['version'] = VERSION
+    return hashlib.sha256((json.dumps(config, sort_keys=True) + sources).encode()).hexdigest()
+
+
+def run_cell(cell, workers=None):
+    '''
+    plays a cell and returns its tally
+    '''
+    table = [(agent_class(name), name + str(i)) for i, name in enumerate(cell['agents'])]
+    tally = run_engine(cell['engine'], table, cell['games'], cell['seed'], workers)
+    del tally['samples']
+    return tally
+
+
+def run_matrix(spec, cache=CACHE, workers=None, verbose=True):
+    '''
+    plays the cells of spec which are not in the cache, and returns every cell
+    with its key, its tally and whether it was cached
+    '''
+    os.makedirs(cache, exist_ok=True)
+    results = []
+    for cell in cells(spec):
+        key = cell_key(cell)
+        path = os.path.join(cache, key + '.json')
+        cached = os.path.exists(path)
+        if cached:
+            with open(path) as f:
+                tally = json.load(f)['tally']
+        else:
+            tally = run_cell(cell, workers)
+            # written to a temporary file first, so an interrupted run leaves no broken entry
+            with open(path + '.tmp', 'w') as f:
+                json.dump({'cell': cell, 'tally': tally}, f)
+            os.replace(path + '.tmp', path)
+        results.append(dict(cell, key=key, tally=tally, cached=cached))
+        if verbose:
+            print(row(results[-1]), flush=True)
+    return results
+
+
+def row(result):
+    '''
+    returns a line of the results table
+    '''
+    tally = result['tally']
+    return '%-20s %2d %-8s %7d  spy win rate %.4f  %s' % (
+        result['mix'], result['players'], result['engine'], tally['games'],
+        tally['spy_wins'] / tally['games'], 'cached' if result['cached'] else 'played')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play a matrix of experiments, reusing cached cells.')
+    parser.add_argument('spec', help='JSON experiment spec')
+    parser.add_argument('--cache', default=CACHE)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--output', help='JSON file to write every cell and its tally to')
+    args = parser.parse_args()
+
+    with open(args.spec) as f:
+        spec = json.load(f)
+    results = run_matrix(spec, args.cache, args.workers)
+    played = sum(1 for result in results if not result['cached'])
+    print('%d cells, %d played, %d cached' % (len(results), played, len(results) - played))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,50 @@
 from agent import Agent
-from random_agent import RandomAgent
-import random
+from assignment import random_assignment
+from teams import from_mask, to_mask
+
+# the informative callbacks broadcast to every agent
+HOOKS = ('vote_outcome', 'mission_outcome', 'round_outcome', 'game_outcome')
+# agent class -> the hooks that class does something in
+_class_hooks = {}
+
+
+def is_noop(function):
+    '''
+    returns True if the body of function does nothing (only pass, or a docstring)
+    '''
+    import dis
+    code = getattr(function, '__code__', None)
+    if code is None:
+        return False
+    ops = [(i.opname, i.argval) for i in dis.get_instructions(code)
+           if i.opname not in ('RESUME', 'NOP', 'CACHE')]
+    return ops in ([('LOAD_CONST', None), ('RETURN_VALUE', None)], [('RETURN_CONST', None)])
+
+
+def class_hooks(agent_class):
+    '''
+    returns the hooks in which agent_class does something.
+    Each class is inspected once.
+    '''
+    hooks = _class_hooks.get(agent_class)
+    if hooks is None:
+        hooks = [hook for hook in HOOKS if hasattr(agent_class, hook)
+                 and not is_noop(getattr(agent_class, hook))]
+        _class_hooks[agent_class] = hooks
+    return hooks
+
+
+def build_listeners(agents):
+    '''
+    returns a dictionary mapping each hook to the list of agents that listen to it,
+    so that broadcasts skip the agents whose hook (looked up on their class) is just pass
+    '''
+    listeners = {hook: [] for hook in HOOKS}
+    for a in agents:
+        for hook in class_hooks(type(a)):
+            listeners[hook].append(a)
+    return listeners
+
 
 class Game:
     '''
@@ -9,52 +53,85 @@ class Game:
     game has a list of Agents and methods are called on those agents 
     to share information and get game actions
     '''
+    __slots__ = ('agents', 'num_players', 'order', 'spies', 'listeners', 'missions_lost', 'failed_rounds',
+                 'proposals', 'rounds', 'profiler', 'watchdog')
 
-    def __init__(self, agents):
+    def __init__(self, agents, history=True, assignment=random_assignment, profiler=None, watchdog=None):
         '''
         agents is the list of agents playing the game
         the list must contain 5-10 agents
+        history is False to keep only the counters and the outcome of the game,
+        rather than every Round and Mission (rounds is then None)
+        assignment chooses the seating and the spies (see assignment.py),
+        order[seat] is then the index in agents of the agent in that seat
+        profiler is an optional profiler.Profiler timing the agents' callbacks during the game
+        watchdog is an optional watchdog.Watchdog enforcing a time budget on the agents' callbacks
         This method initiaises the game by
-        - shuffling the agents
-        - randomly assigning spies
+        - seating the agents and choosing the spies with assignment
         - calling the new_game method on all agents
         - build a scoreboard and data structures
         '''
         if len(agents)<5 or len(agents)>10:
             raise Exception('Agent array out of range')
-        #clone and shuffle agent array
-        self.agents = agents.copy()
-        random.shuffle(self.agents)
         self.num_players = len(agents)
-        #allocate spies
-        self.spies = []
-        while len(self.spies) < Agent.spy_count[self.num_players]:
-            spy = random.randrange(self.num_players)
-            if spy not in self.spies:
-                self.spies.append(spy)
+        #seat the agents and allocate spies
+        self.order, self.spies = assignment(self.num_players)
+        self.agents = [agents[i] for i in self.order]
+        self.profiler = profiler
+        self.watchdog = watchdog
+        if watchdog is not None:
+            watchdog.start_game(self.agents)
+        if profiler is not None:
+            profiler.start_game(self.agents)
         #start game for each agent        
-        for agent_id in range(self.num_players):
-            spy_list = self.spies.copy() if agent_id in self.spies else []
-            self.agents[agent_id].new_game(self.num_players,agent_id, spy_list)
+        try:
+            for agent_id in range(self.num_players):
+                spy_list = self.spies.copy() if agent_id in self.spies else []
+                self.agents[agent_id].new_game(self.num_players,agent_id, spy_list)
+        except BaseException:
+            self.end_game()
+            raise
+        #agents listening to each informative hook
+        self.listeners = build_listeners(self.agents)
         #initialise rounds
         self.missions_lost = 0
-        self.rounds = []
+        # bit i is set if round i failed
+        self.failed_rounds = 0
+        self.proposals = 0
+        self.rounds = [] if history else None
             
 
     def play(self):
-        leader_id = 0
-        for i in range(5):
-            self.rounds.append(Round(leader_id,self.agents, self.spies, i))
-            if not self.rounds[i].play(): self.missions_lost+= 1
-            for a in self.agents:
-                a.round_outcome(i+1, self.missions_lost)
-            leader_id = (leader_id+len(self.rounds[i].missions)) % len(self.agents)    
-        for a in self.agents:
-            a.game_outcome(self.missions_lost>2, self.spies)
+        try:
+            leader_id = 0
+            for i in range(5):
+                rnd = Round(leader_id,self.agents, self.spies, i, self.rounds is not None, self.listeners)
+                if self.rounds is not None:
+                    self.rounds.append(rnd)
+                if not rnd.play():
+                    self.missions_lost+= 1
+                    self.failed_rounds |= 1 << i
+                self.proposals += rnd.proposals
+                for a in self.listeners['round_outcome']:
+                    a.round_outcome(i+1, self.missions_lost)
+                leader_id = (leader_id+rnd.proposals) % len(self.agents)    
+            for a in self.listeners['game_outcome']:
+                a.game_outcome(self.missions_lost>2, self.spies)
+        finally:
+            self.end_game()
+
+    def end_game(self):
+        '''
+        gives the agents their own callbacks back, even when an agent raised
+        '''
+        if self.profiler is not None:
+            self.profiler.end_game()
+        if self.watchdog is not None:
+            self.watchdog.end_game()
 
     def __str__(self):
         s = 'Game between agents:' + str(self.agents)
-        for r in self.rounds:
+        for r in self.rounds or []:
             s = s + '\n' + str(r)
         if self.missions_lost<3:
             s = s + '\nThe Resistance succeeded!'
@@ -67,26 +144,33 @@ class Round():
     '''
     a representation of a round in the game.
     '''
+    __slots__ = ('leader_id', 'agents', 'spies', 'rnd', 'listeners', 'missions', 'proposals', 'success')
 
-    def __init__(self, leader_id, agents, spies, rnd):
+    def __init__(self, leader_id, agents, spies, rnd, history=True, listeners=None):
         '''
         leader_id is the current leader (next to propose a mission)
         agents is the list of agents in the game,
         spies is the list of indexes of spies in the game
         rnd is what round the game is up to 
+        history is False to keep only the number of proposed missions
+        and the outcome, rather than every Mission (missions is then None)
+        listeners maps each hook to the agents listening to it (see build_listeners)
         '''
         self.leader_id = leader_id
         self.agents = agents
         self.spies = spies
         self.rnd = rnd
-        self.missions = []
+        self.listeners = listeners if listeners is not None else build_listeners(agents)
+        self.missions = [] if history else None
+        self.proposals = 0
+        self.success = False
 
     def __str__(self):
         '''
         produces a string representation of the round
         '''
         s = 'Round:' + str(self.rnd + 1)
-        for m in self.missions:
+        for m in self.missions or []:
             s = s +'\n'+str(m)
         if self.is_successful():
             s = s + '\nResistance won the round.'
@@ -98,10 +182,10 @@ class Round():
         '''
         produces a formal representation of the round
         '''
-        s = 'Round(leader_id=' + self.leader_id \
-                + ', agents=' + self.agents \
-                + ', rnd=' + self.rnd \
-                + ', missions=' + self.missions+')'
+        s = 'Round(leader_id=' + str(self.leader_id) \
+                + ', agents=' + str(self.agents) \
+                + ', rnd=' + str(self.rnd) \
+                + ', missions=' + str(self.missions)+')'
         return s        
 
     def play(self):
@@ -112,28 +196,35 @@ class Round():
         '''
         mission_size = Agent.mission_sizes[len(self.agents)][self.rnd]
         fails_required = Agent.fails_required[len(self.agents)][self.rnd]
-        while len(self.missions)<5:
+        while self.proposals<5:
             team = self.agents[self.leader_id].propose_mission(mission_size, fails_required)
-            mission = Mission(self.leader_id, team, self.agents, self.spies, self.rnd, len(self.missions)==4)
-            self.missions.append(mission)
+            mission = Mission(self.leader_id, team, self.agents, self.spies, self.rnd, self.proposals==4, self.listeners)
+            self.proposals += 1
+            if self.missions is not None:
+                self.missions.append(mission)
             self.leader_id = (self.leader_id+1) % len(self.agents)
             if mission.is_approved():
-                return mission.is_successful()
-        return mission.is_successful()   
+                break
+        self.success = mission.is_successful()
+        return self.success
 
     def is_successful(self):
         '''
         returns true is the mission was successful
         '''
-        return len(self.missions)>0 and self.missions[-1].is_successful()
+        return self.success
+
 
 
 class Mission():
     '''
-    a representation of a proposed mission
+    a representation of a proposed mission.
+    The votes are stored as a bitmask of agent indexes and the betrayals as a count,
+    so a mission is a single row of (leader, team, votes, fails).
     '''
-    
-    def __init__(self, leader_id, team, agents, spies, rnd, auto_approve):
+    __slots__ = ('leader_id', 'team', 'agents', 'rnd', 'votes', 'fails')
+
+    def __init__(self, leader_id, team, agents, spies, rnd, auto_approve, listeners=None):
         '''
         leader_id is the id of the agent who proposed the mission
         team is the list of agent indexes on the mission
@@ -141,31 +232,40 @@ class Mission():
         spies is the list of indexes of spies in the game
         rnd is the round number of the game
         auto_approve is true if this is the fifth mission proposed this round, and no vite is required.
+        listeners maps each hook to the agents listening to it (see build_listeners)
         '''
         self.leader_id = leader_id
         self.team = team
         self.agents = agents
-        self.spies = spies
         self.rnd = rnd
-        self.run(auto_approve)
+        self.run(spies, auto_approve, listeners if listeners is not None else build_listeners(agents))
 
 
-    def run(self, auto_approve):    
+    def run(self, spies, auto_approve, listeners):    
         '''
         Runs the mission, by asking agents to vote, 
         and if the vote is in favour,
         asking spies if they wish to fail the mission
         '''
-        self.votes_for = [i for i in range(len(self.agents)) if auto_approve or self.agents[i].vote(self.team, self.leader_id)]
-        for a in self.agents:
-            a.vote_outcome(self.team, self.leader_id, self.votes_for)
-        if 2*len(self.votes_for) > len(self.agents):
-            self.fails = [i for i in self.team if i in self.spies and self.agents[i].betray(self.team, self.leader_id)]
-            success = len(self.fails) < Agent.fails_required[len(self.agents)][self.rnd]
-            for a in self.agents:
-                a.mission_outcome(self.team,self.leader_id, len(self.fails), success)
+        votes_for = [i for i in range(len(self.agents)) if auto_approve or self.agents[i].vote(self.team, self.leader_id)]
+        self.votes = to_mask(votes_for)
+        for a in listeners['vote_outcome']:
+            a.vote_outcome(self.team, self.leader_id, votes_for)
+        # fails is None until the mission is approved
+        self.fails = None
+        if 2*len(votes_for) > len(self.agents):
+            self.fails = sum(1 for i in self.team if i in spies and self.agents[i].betray(self.team, self.leader_id))
+            success = self.fails < Agent.fails_required[len(self.agents)][self.rnd]
+            for a in listeners['mission_outcome']:
+                a.mission_outcome(self.team,self.leader_id, self.fails, success)
 
 
+    @property
+    def votes_for(self):
+        '''
+        the list of indexes of the agents who voted for the mission
+        '''
+        return from_mask(self.votes)
 
     def __str__(self):
         '''
@@ -178,7 +278,7 @@ class Mission():
         for i in self.votes_for:
             s+= str(self.agents[i])+', '
         if self.is_approved():    
-            s = s[:-2]+'\nFails recorded:'+ str(len(self.fails))
+            s = s[:-2]+'\nFails recorded:'+ str(self.fails)
             s += '\nMission '+ ('Succeeded' if self.is_successful() else 'Failed')
         else:
             s = s[:-2]+'\nMission Aborted'
@@ -188,27 +288,25 @@ class Mission():
         '''
         Creates formal (json) representation of the mission
         '''
-        return 'Mission(leader_id='+ self.agents[self.leader_id] \
-                       + ', team='+self.team \
-                       +', agents='+self.agents \
-                       +', rnd='+self.rnd \
-                       +', votes_for='+self.votes_for \
-                       +', fail_num=' +len(self.fails)+')'
+        return 'Mission(leader_id='+ str(self.agents[self.leader_id]) \
+                       + ', team='+str(self.team) \
+                       +', agents='+str(self.agents) \
+                       +', rnd='+str(self.rnd) \
+                       +', votes_for='+str(self.votes_for) \
+                       +', fail_num=' +str(self.fails)+')'
 
     
     def is_approved(self):
         '''
         Returns True if the mission is approved, 
-        False if the mission is not approved,
-        and 
-        Raises an exception if the mission has not yet had the votes recorded
+        False if the mission is not approved.
         '''
-        return 2*len(self.votes_for) > len(self.agents)
+        return self.fails is not None
 
     def is_successful(self):
         '''
         Returns True is no agents failed the mission 
         (or only one agent failed round 4 in a game of 7 or more players)
-        raises an exception if the mission is not approved or fails not recorded.
+        Returns False if the mission is not approved.
         '''
-        return self.is_approved() and len(self.fails) < Agent.fails_required[len(self.agents)][self.rnd]
\ No newline at end of file
+        return self.is_approved() and self.fails < Agent.fails_required[len(self.agents)][self.rnd]
@@ -0,0 +1,180 @@
+'''
+Append-only binary log of finished games.
+The file is a 16 byte header followed by fixed size records, one per proposed mission,
+so a reader can memory-map it as a NumPy structured array without parsing anything.
+Teams, votes and spies are bitmasks of seats (bit i is seat i),
+and the seating is packed 4 bits per seat (bits 4i..4i+3 are the table index of seat i).
+'''
+import numpy as np
+from teams import to_mask
+
+MAGIC = b'RESLOG\x00\x01'
+HEADER_SIZE = 16
+
+RECORD = np.dtype([
+    ('game', '<u8'),          # game id, the seed in tournaments
+    ('players', 'u1'),        # number of players
+    ('round', 'u1'),          # 0-4
+    ('proposal', 'u1'),       # index of the proposal in the round, 0-4
+    ('leader', 'u1'),         # seat of the agent who proposed the mission
+    ('team', '<u2'),          # seats on the mission
+    ('votes', '<u2'),         # seats who voted for the mission
+    ('fails', 'i1'),          # number of betrayals, -1 if the mission was not approved
+    ('spies', '<u2'),         # seats of the spies
+    ('missions_lost', 'u1'),  # final number of failed missions of the game
+    ('order', '<u8'),         # table index of the agent in each seat, 4 bits per seat
+])
+
+
+def header():
+    '''
+    returns the header of a log file: the magic and the record size
+    '''
+    return MAGIC + np.array([RECORD.itemsize, 0], dtype='<u4').tobytes()
+
+
+def pack_order(order):
+    '''
+    packs a seating (order[seat] is a table index) in an integer, 4 bits per seat
+    '''
+    packed = 0
+    for seat, index in enumerate(order):
+        packed |= index << (4 * seat)
+    return packed
+
+
+def seat_of(packed_order, num_players, index):
+    '''
+    returns the seat of the agent at table index in a packed seating
+    '''
+    for seat in range(num_players):
+        if (packed_order >> (4 * seat)) & 15 == index:
+            return seat
+    raise ValueError('no agent %d in the seating' % index)
+
+
+def game_rows(game, game_id):
+    '''
+    returns the records of a finished game as a structured array.
+    The game must have been played with history.
+    '''
+    if game.rounds is None:
+        raise ValueError('only games played with history can be logged')
+    rows = np.zeros(sum(len(r.missions) for r in game.rounds), dtype=RECORD)
+    rows['game'] = game_id
+    rows['players'] = game.num_players
+    rows['spies'] = to_mask(game.spies)
+    rows['missions_lost'] = game.missions_lost
+    rows['order'] = pack_order(game.order)
+    i = 0
+    for r in game.rounds:
+        for proposal, mission in enumerate(r.missions):
+            row = rows[i]
+            row['round'] = r.rnd
+            row['proposal'] = proposal
+            row['leader'] = mission.leader_id
+            row['team'] = to_mask(mission.team)
+            row['votes'] = mission.votes
+            row['fails'] = mission.fails if mission.is_approved() else -1
+            i += 1
+    return rows
+
+
+class GameLogWriter:
+    '''
+    appends games to a log file, creating it if needed.
+    A record left incomplete by an interrupted writer is truncated before appending,
+    so the records written after it stay aligned.
+    '''
+
+    def __init__(self, path):
+        self.file = open(path, 'ab')
+        size = self.file.tell()
+        if size == 0:
+            self.file.write(header())
+            return
+        try:
+            check_header(path)
+        except ValueError:
+            self.file.close()
+            raise
+        partial = (size - HEADER_SIZE) % RECORD.itemsize
+        if partial:
+            self.file.truncate(size - partial)
+
+    def write(self, game, game_id):
+        '''
+        appends a finished game
+        '''
+        self.file.write(game_rows(game, game_id).tobytes())
+
+    def write_bytes(self, data):
+        '''
+        appends records already encoded (e.g. by a worker process)
+        '''
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def check_header(path):
+    '''
+    raises ValueError if the file at path is not a log with this record layout
+    '''
+    with open(path, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(path + ' is not a game log')
+    if data != header():
+        raise ValueError(path + ' was written with another record layout')
+
+
+class GameLogReader:
+    '''
+    memory-maps a log file: records is a read-only structured array of RECORD
+    which is paged in from disk as it is used.
+    A record left incomplete by an interrupted writer is ignored.
+    '''
+
+    def __init__(self, path):
+        check_header(path)
+        with open(path, 'rb') as f:
+            f.seek(0, 2)
+            count = (f.tell() - HEADER_SIZE) // RECORD.itemsize
+        if count == 0:
+            self.records = np.zeros(0, dtype=RECORD)
+        else:
+            self.records = np.memmap(path, dtype=RECORD, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+    def __len__(self):
+        return len(self.records)
+
+    def games(self):
+        '''
+        yields (game id, records of the game) for every game, in the order they were written
+        '''
+        ids = self.records['game']
+        if len(ids) == 0:
+            return
+        starts = np.flatnonzero(np.diff(ids)) + 1
+        bounds = np.concatenate(([0], starts, [len(ids)]))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield int(ids[start]), self.records[start:end]
+
+    def outcomes(self):
+        '''
+        returns one record per game (its first one), which holds the game's
+        players, seating, spies and missions_lost
+        '''
+        ids = self.records['game']
+        if len(ids) == 0:
+            return self.records
+        first = np.concatenate(([0], np.flatnonzero(np.diff(ids)) + 1))
+        return self.records[first]
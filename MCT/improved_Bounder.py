@@ -1,6 +1,7 @@
 from queue import PriorityQueue
 import random
 from agent import Agent
+from teams import to_mask, team_size
 
 class Bounder:
     '''An abstract super class for an agent in the game The Resistance.
@@ -82,6 +83,7 @@ class Bounder:
         self.trust_set = set(self.player_list)
         
         self.spy_list = spies
+        self.spy_mask = to_mask(spies)
         # Initialize a trust list, trust everyone at the start,containing 4 trust sets
         self.trust_list = []
         for i in range(4):
@@ -154,9 +156,7 @@ class Bounder:
         # First round, vote yes because everyone is in trust_set
         # From second round, check if agents of the proposed team in trust set/clearly_know list or not
         if self.is_spy():
-            spy_set = set(self.spy_list)
-            team_set = set(mission)
-            return not team_set.isdisjoint(spy_set)
+            return to_mask(mission) & self.spy_mask != 0
         else:
             # this is the 5th propose, have to vote yes as a resistance
             if self.vote_times == 5:
@@ -0,0 +1,216 @@
+'''
+Rating league: rates agents as spies and as the resistance from the games they play together,
+and chooses each table to learn the most about the ratings, rather than playing a fixed table.
+A rating is a mean and a variance (Glicko style, on the Elo scale): a team's rating is the
+mean of its members' ratings for their role, and after each game every member moves towards
+the outcome in proportion to its variance and its share of the team, while its variance shrinks.
+A new agent starts with a large variance, so it is both picked often and moves fast
+until its rating settles.
+
+    python league.py [--agents Bounder Grader RandomAgent] [--players 5] [--games 2000] [--state league.json]
+'''
+import argparse
+import json
+import os
+import random
+from itertools import combinations_with_replacement
+from math import log, sqrt
+from agent import Agent
+from assignment import StratumAssignment
+from game import Game
+from registry import AGENTS, agent_class, can_spy
+from tournament import play_game
+
+ROLES = ('spy', 'res')
+START_RATING = 1500.0
+START_VARIANCE = 350.0 ** 2
+# ln(10)/400: converts Elo points to the natural logistic scale
+Q = log(10) / 400
+
+
+def expected(res_rating, spy_rating):
+    '''
+    returns the probability that the resistance wins, for the given team ratings
+    '''
+    return 1 / (1 + 10 ** ((spy_rating - res_rating) / 400))
+
+
+class League:
+    '''
+    ratings maps (agent name, role) to [mean, variance, games].
+    agents lists the names of the agents in the league, spies those who can play as spies.
+    '''
+
+    def __init__(self, agents, num_players=5, seed=0):
+        self.num_players = num_players
+        self.ratings = {}
+        self.agents = []
+        self.spies = []
+        self.random = random.Random(seed)
+        self.next_seed = seed
+        for name in agents:
+            self.add(name)
+
+    def add(self, name):
+        '''
+        adds an agent to the league, unrated (an agent already in it keeps its ratings)
+        '''
+        if name not in self.agents:
+            self.agents.append(name)
+            if can_spy(name):
+                self.spies.append(name)
+        for role in ROLES:
+            self.ratings.setdefault((name, role), [START_RATING, START_VARIANCE, 0])
+
+    def team_rating(self, team, role):
+        '''
+        returns the rating of a team (a tuple of agent names) in role
+        '''
+        return sum(self.ratings[name, role][0] for name in team) / len(team)
+
+    def information(self, spies, resistance):
+        '''
+        returns the total variance the ratings would lose by playing a game of the spies
+        against the resistance: games with an uncertain outcome, between agents
+        whose ratings are uncertain, are worth the most
+        '''
+        p = expected(self.team_rating(resistance, 'res'), self.team_rating(spies, 'spy'))
+        gain = 0.0
+        for team, role in ((spies, 'spy'), (resistance, 'res')):
+            for name in set(team):
+                variance = self.ratings[name, role][1]
+                weight = team.count(name) / len(team)
+                gain += variance - 1 / (1 / variance + Q * Q * weight * weight * p * (1 - p))
+        return gain
+
+    def compositions(self):
+        '''
+        returns every (spies, resistance) pair of teams the league can seat,
+        an agent can appear several times in a team
+        '''
+        spy_count = Agent.spy_count[self.num_players]
+        return [(spies, resistance)
+                for spies in combinations_with_replacement(self.spies, spy_count)
+                for resistance in combinations_with_replacement(self.agents, self.num_players - spy_count)]
+
+    def choose(self):
+        '''
+        returns the composition with the most information (ties broken at random)
+        '''
+        scored = [(self.information(spies, resistance), self.random.random(), spies, resistance)
+                  for spies, resistance in self.compositions()]
+        _, _, spies, resistance = max(scored)
+        return spies, resistance
+
+    def update(self, spies, resistance, spies_win):
+        '''
+        updates the ratings of the members of both teams after a game
+        '''
+        p = expected(self.team_rating(resistance, 'res'), self.team_rating(spies, 'spy'))
+        for team, role, score, chance in ((spies, 'spy', spies_win, 1 - p),
+                                          (resistance, 'res', not spies_win, p)):
+            for name in set(team):
+                rating = self.ratings[name, role]
+                weight = team.count(name) / len(team)
+                rating[1] = 1 / (1 / rating[1] + Q * Q * weight * weight * chance * (1 - chance))
+                rating[0] += Q * rating[1] * weight * (score - chance)
+                rating[2] += 1
+
+    def play(self, spies, resistance):
+        '''
+        plays one game of the composition, with random seats, and updates the ratings.
+        Returns True if the spies won.
+        '''
+        table = [(agent_class(name), name + str(i)) for i, name in enumerate(spies + resistance)]
+        assignment = StratumAssignment(range(len(spies)))
+        _, game = play_game(table, Game, self.next_seed, False, assignment)
+        self.next_seed += 1
+        spies_win = game.missions_lost >= 3
+        self.update(spies, resistance, spies_win)
+        return spies_win
+
+    def run(self, games, settled=None):
+        '''
+        plays games games, each with the composition chosen by choose,
+        or stops early once the standard deviation of every rating in standings is below settled
+        (the spy ratings of the agents who cannot spy never move, so they are left out).
+        Returns the number of games played.
+        '''
+        for played in range(games):
+            if settled is not None and max(deviation for _, _, _, deviation, _ in self.standings()) < settled:
+                return played
+            self.play(*self.choose())
+        return games
+
+    def standings(self):
+        '''
+        returns (agent, role, rating, deviation, games) rows, best first within each role
+        '''
+        rows = []
+        for role in ROLES:
+            names = self.spies if role == 'spy' else self.agents
+            for name in sorted(names, key=lambda n: -self.ratings[n, role][0]):
+                mean, variance, played = self.ratings[name, role]
+                rows.append((name, role, mean, sqrt(variance), played))
+        return rows
+
+    def report(self):
+        '''
+        returns the standings as a table
+        '''
+        lines = ['%-12s %-4s %8s %8s %8s' % ('agent', 'role', 'rating', '+-', 'games')]
+        for name, role, mean, deviation, played in self.standings():
+            lines.append('%-12s %-4s %8.1f %8.1f %8d' % (name, role, mean, deviation, played))
+        return '\n'.join(lines)
+
+    def save(self, path):
+        '''
+        writes the league to path as JSON
+        '''
+        with open(path, 'w') as f:
+            json.dump({
+                'num_players': self.num_players,
+                'next_seed': self.next_seed,
+                'agents': self.agents,
+                'ratings': [[name, role] + rating for (name, role), rating in self.ratings.items()],
+            }, f, indent=1)
+
+    @classmethod
+    def load(cls, path, seed=0):
+        '''
+        reads a league written by save
+        '''
+        with open(path) as f:
+            state = json.load(f)
+        league = cls(state['agents'], state['num_players'], seed)
+        league.next_seed = state['next_seed']
+        for name, role, mean, variance, played in state['ratings']:
+            league.ratings[name, role] = [mean, variance, played]
+        return league
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rate the agents in a league with adaptive matchmaking.')
+    parser.add_argument('--agents', nargs='+', default=['RandomAgent', 'Bounder', 'Grader'], choices=list(AGENTS))
+    parser.add_argument('--players', type=int, default=5, choices=sorted(Agent.mission_sizes))
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--settled', type=float, help='stop once every rating is known to +- this')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--state', help='JSON file the league is loaded from (if it exists) and saved to')
+    args = parser.parse_args()
+
+    if args.state and os.path.exists(args.state):
+        league = League.load(args.state, args.seed)
+        for name in args.agents:
+            league.add(name)
+    else:
+        league = League(args.agents, args.players, args.seed)
+    played = league.run(args.games, args.settled)
+    print('%d games' % played)
+    print(league.report())
+    if args.state:
+        league.save(args.state)
+
+
+if __name__ == '__main__':
+    main()
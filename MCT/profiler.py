@@ -0,0 +1,134 @@
+'''
+Opt-in profiling of agent callbacks.
+A Profiler given to a Game times every callback of its agents, aggregated by
+agent class and method, along with the total time of the games, so what is
+left over is the time spent in the engine itself.
+Without a profiler the engine does not touch the agents.
+'''
+import json
+import time
+from callbacks import Patcher
+
+
+class Profiler(Patcher):
+    '''
+    stats maps (agent class name, method) to [calls, total ns, max ns].
+    With keep_samples, samples maps the same keys to the list of every call's duration in ns.
+    '''
+
+    def __init__(self, keep_samples=False):
+        self.stats = {}
+        self.samples = {} if keep_samples else None
+        self.games = 0
+        self.game_ns = 0
+        self._game_start = None
+        # id(agent) -> (agent, its instance attributes replaced by timers)
+        self._attached = {}
+
+    def timer(self, agent, method):
+        '''
+        returns a wrapper of agent's bound method which records the duration of each call
+        '''
+        function = getattr(agent, method)
+        key = (type(agent).__name__, method)
+        entry = self.stats.setdefault(key, [0, 0, 0])
+        samples = self.samples.setdefault(key, []) if self.samples is not None else None
+        clock = time.perf_counter_ns
+
+        def timed(*args):
+            start = clock()
+            try:
+                return function(*args)
+            finally:
+                elapsed = clock() - start
+                entry[0] += 1
+                entry[1] += elapsed
+                if elapsed > entry[2]:
+                    entry[2] = elapsed
+                if samples is not None:
+                    samples.append(elapsed)
+        return timed
+
+    def wrap(self, agent, method):
+        return self.timer(agent, method)
+
+    def start_game(self, agents):
+        '''
+        called by Game before new_game: attaches to the agents and starts the game clock
+        '''
+        self.attach(agents)
+        self._game_start = time.perf_counter_ns()
+
+    def end_game(self):
+        '''
+        called by Game after game_outcome: stops the game clock and detaches from the agents
+        '''
+        self.game_ns += time.perf_counter_ns() - self._game_start
+        self.games += 1
+        self.detach()
+
+    def merge(self, other):
+        '''
+        adds the profile of other (e.g. from a worker process) to this one
+        '''
+        self.games += other.games
+        self.game_ns += other.game_ns
+        for key, (calls, total, longest) in other.stats.items():
+            entry = self.stats.setdefault(key, [0, 0, 0])
+            entry[0] += calls
+            entry[1] += total
+            entry[2] = max(entry[2], longest)
+        if self.samples is not None and other.samples is not None:
+            for key, durations in other.samples.items():
+                self.samples.setdefault(key, []).extend(durations)
+        return self
+
+    def __getstate__(self):
+        # timers and attached agents stay in their process
+        state = self.__dict__.copy()
+        state['_attached'] = {}
+        state['_game_start'] = None
+        return state
+
+    def agent_ns(self):
+        '''
+        returns the total time spent in agent callbacks
+        '''
+        return sum(total for _, total, _ in self.stats.values())
+
+    def as_dict(self):
+        '''
+        returns the profile as a JSON serialisable dictionary
+        '''
+        return {
+            'games': self.games,
+            'game_seconds': self.game_ns / 1e9,
+            'engine_seconds': (self.game_ns - self.agent_ns()) / 1e9,
+            'calls': [{'agent': agent, 'method': method, 'calls': calls,
+                       'total_seconds': total / 1e9, 'max_us': longest / 1000}
+                      for (agent, method), (calls, total, longest) in sorted(self.stats.items())],
+        }
+
+    def dump(self, path):
+        '''
+        writes the profile to path as JSON
+        '''
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=1)
+
+    def report(self):
+        '''
+        returns the profile as a table, slowest callbacks first
+        '''
+        game_ns = self.game_ns or 1
+        lines = ['%d games, %.3f s, engine %.3f s (%.1f%%)'
+                 % (self.games, self.game_ns / 1e9, (self.game_ns - self.agent_ns()) / 1e9,
+                    100 * (self.game_ns - self.agent_ns()) / game_ns),
+                 '%-12s %-16s %10s %12s %10s %12s %7s'
+                 % ('agent', 'method', 'calls', 'total s', 'mean us', 'max us', 'share')]
+        for (agent, method), (calls, total, longest) in sorted(self.stats.items(), key=lambda s: -s[1][1]):
+            if calls:
+                lines.append('%-12s %-16s %10d %12.3f %10.2f %12.2f %6.1f%%'
+                             % (agent, method, calls, total / 1e9, total / calls / 1000,
+                                longest / 1000, 100 * total / game_ns))
+        return '\n'.join(lines)
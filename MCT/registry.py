@@ -0,0 +1,78 @@
+'''
+Agents and engines by name, imported only when they are used,
+so that a run of RandomAgents and Bounders never imports MCT_agent (and NumPy).
+'''
+from importlib import import_module
+
+# agent name -> (module, class, can play as a spy)
+AGENTS = {
+    'RandomAgent': ('random_agent', 'RandomAgent', True),
+    'Bounder': ('improved_Bounder', 'Bounder', True),
+    'Grader': ('Grader', 'Grader', True),
+    # MCTAgent has no spy logic
+    'MCTAgent': ('MCT_agent', 'MCTAgent', False),
+    'MCTArrayAgent': ('MCT_agent', 'MCTArrayAgent', False),
+}
+
+# engine name -> (module, Game class, description), for the games of tournament.run
+ENGINES = {
+    'against': ('Against', 'Game', 'table order kept, the first agents are the spies'),
+    'game': ('game', 'Game', 'random seating and spies'),
+    'async': ('async_game', 'Game', 'asyncio version of game, the same games'),
+}
+
+# engine name -> (module, run function, description), for the engines which play a whole run themselves:
+# run(table, games, seed, workers) returns a tally, as tournament.run does
+RUNNERS = {
+    'batch': ('batch_engine', 'run_table', 'vectorized games of RandomAgent tables, random seating and spies'),
+    'pool': ('agent_pool', 'run_table', 'game with the agents hosted in worker processes for the whole run'),
+}
+
+
+def agent_class(name):
+    '''
+    returns the class of the agent name, importing its module
+    '''
+    if name not in AGENTS:
+        raise ValueError('unknown agent %s, expected one of %s' % (name, ', '.join(AGENTS)))
+    module, cls, _ = AGENTS[name]
+    return getattr(import_module(module), cls)
+
+
+def can_spy(name):
+    '''
+    returns True if the agent name can play as a spy
+    '''
+    return AGENTS[name][2]
+
+
+def engine(name):
+    '''
+    returns the Game class of the engine name, importing its module
+    '''
+    if name not in ENGINES:
+        raise ValueError('unknown engine %s, expected one of %s' % (name, ', '.join(ENGINES)))
+    module, cls, _ = ENGINES[name]
+    return getattr(import_module(module), cls)
+
+
+def engine_module(name):
+    '''
+    returns the module of the engine name, of ENGINES or RUNNERS
+    '''
+    if name in ENGINES:
+        return ENGINES[name][0]
+    if name in RUNNERS:
+        return RUNNERS[name][0]
+    raise ValueError('unknown engine %s, expected one of %s' % (name, ', '.join(list(ENGINES) + list(RUNNERS))))
+
+
+def run_engine(name, table, games, seed=0, workers=None):
+    '''
+    plays games games of the table with the engine name, of ENGINES or RUNNERS, and returns their tally
+    '''
+    if name in RUNNERS:
+        module, function, _ = RUNNERS[name]
+        return getattr(import_module(module), function)(table, games, seed, workers)
+    from tournament import run
+    return run(table, engine(name), games, seed, workers)
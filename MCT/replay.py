@@ -0,0 +1,97 @@
+'''
+Replays recorded games (see game_log.py) through one agent.
+The agent gets the same new_game and *_outcome callbacks it would have had in the game,
+and is asked the same propose_mission, vote and betray questions, so the decisions
+it would now make can be compared with the recorded ones without simulating the other agents.
+'''
+from collections import namedtuple
+import random
+from agent import Agent
+from teams import from_mask, to_mask
+from game_log import GameLogReader, seat_of
+
+# method is 'propose_mission', 'vote' or 'betray'.
+# recorded is None when the log cannot tell what the agent did
+# (a betrayal on a mission with several spies and an ambiguous fail count).
+Decision = namedtuple('Decision', ['game', 'round', 'proposal', 'method', 'recorded', 'replayed', 'diverged'])
+
+
+def replay_game(agent, rows, seat):
+    '''
+    re-drives agent through the game recorded in rows, sitting in seat,
+    and returns the list of Decisions it made.
+    Teams are passed as ascending lists of seats, whatever order they were proposed in.
+    '''
+    game_id = int(rows[0]['game'])
+    num_players = int(rows[0]['players'])
+    spies = from_mask(int(rows[0]['spies']))
+    agent.new_game(num_players, seat, spies.copy() if seat in spies else [])
+    decisions = []
+    missions_lost = 0
+    rnd = -1
+    for row in rows:
+        if row['round'] != rnd:
+            if rnd >= 0:
+                agent.round_outcome(rnd + 1, missions_lost)
+            rnd = int(row['round'])
+        proposal = int(row['proposal'])
+        leader = int(row['leader'])
+        team_mask = int(row['team'])
+        team = from_mask(team_mask)
+        votes = int(row['votes'])
+        fails = int(row['fails'])
+        fails_required = Agent.fails_required[num_players][rnd]
+        if leader == seat:
+            proposed = to_mask(agent.propose_mission(Agent.mission_sizes[num_players][rnd], fails_required))
+            decisions.append(Decision(game_id, rnd, proposal, 'propose_mission',
+                                      team, from_mask(proposed), proposed != team_mask))
+        # the fifth proposal of a round is approved without a vote
+        if proposal < 4:
+            recorded = bool(votes >> seat & 1)
+            replayed = bool(agent.vote(team, leader))
+            decisions.append(Decision(game_id, rnd, proposal, 'vote', recorded, replayed, recorded != replayed))
+        agent.vote_outcome(team, leader, from_mask(votes))
+        if fails < 0:
+            continue
+        if seat in spies and seat in team:
+            replayed = bool(agent.betray(team, leader))
+            spies_on_team = len([i for i in team if i in spies])
+            # the fail count only pins the agent's choice down when nobody or every spy betrayed
+            recorded = False if fails == 0 else True if fails == spies_on_team else None
+            decisions.append(Decision(game_id, rnd, proposal, 'betray', recorded, replayed,
+                                      recorded is not None and recorded != replayed))
+        success = fails < fails_required
+        if not success:
+            missions_lost += 1
+        agent.mission_outcome(team, leader, fails, success)
+    agent.round_outcome(rnd + 1, missions_lost)
+    agent.game_outcome(missions_lost > 2, spies)
+    return decisions
+
+
+def replay(agent, path, table_index=None, seat=None, stop_at_divergence=True):
+    '''
+    replays every game of the log at path through agent and returns (decisions, first divergence).
+    The agent takes the place of the agent at table_index of the recorded table
+    (located in each game through the recorded seating), or sits in a fixed seat.
+    With stop_at_divergence, replay stops after the first game with a divergence.
+    The first divergence is None if the agent made all the recorded decisions.
+    The random number generator is seeded with the game id before each game, so two
+    replays of the same log give the same decisions for the same agent, but random
+    decisions generally differ from the recorded ones (the other agents drew numbers too).
+    '''
+    if (table_index is None) == (seat is None):
+        raise ValueError('give either table_index or seat')
+    decisions = []
+    first = None
+    for _, rows in GameLogReader(path).games():
+        if table_index is not None:
+            seat = seat_of(int(rows[0]['order']), int(rows[0]['players']), table_index)
+        random.seed(int(rows[0]['game']))
+        made = replay_game(agent, rows, seat)
+        decisions.extend(made)
+        if first is None:
+            first = next((d for d in made if d.diverged), None)
+            if first is not None and stop_at_divergence:
+                break
+    return decisions, first
@@ -0,0 +1,235 @@
+'''
+Columnar store of finished games, for slicing tournament results after the fact.
+A store is a directory of immutable chunks, one per append, each holding one .npy file
+per column with one row per game, and a meta.json with the names of the agents
+(columns hold their codes) and the number of chunks.
+Queries only load the columns they use, memory-mapped, and the partial sums of a chunk
+are kept, so asking the same question again after an append only reads the new chunks.
+
+Columns (one row per game, seat columns have 10 entries, 255 past the last seat):
+    seed            u8  seed of the game
+    players         u1  number of players
+    agents          u1  code of the agent class in each seat
+    order           u1  table index of the agent in each seat
+    spies           u2  bitmask of the seats of the spies
+    failed_rounds   u1  bitmask of the rounds the resistance lost
+    missions_lost   u1  number of failed missions
+    proposals       u1  number of missions proposed
+
+    python results_store.py STORE [--by agent role] [--where players=5 role=spy]
+'''
+import argparse
+import json
+import os
+import numpy as np
+from teams import to_mask
+
+MAX_PLAYERS = 10
+EMPTY = 255
+COLUMNS = {
+    'seed': ('<u8', ()),
+    'players': ('u1', ()),
+    'agents': ('u1', (MAX_PLAYERS,)),
+    'order': ('u1', (MAX_PLAYERS,)),
+    'spies': ('<u2', ()),
+    'failed_rounds': ('u1', ()),
+    'missions_lost': ('u1', ()),
+    'proposals': ('u1', ()),
+}
+# keys of the per seat entries that queries can group and filter by
+SEAT_KEYS = ('agent', 'role', 'seat', 'table_index', 'players', 'missions_lost')
+ROLES = ('res', 'spy')
+
+
+class GameRows:
+    '''
+    collects the columns of finished games (all but agents, which the store fills in
+    from the table), e.g. in a tournament worker
+    '''
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, game, seed):
+        order = list(game.order) + [EMPTY] * (MAX_PLAYERS - len(game.order))
+        self.rows.append((seed, game.num_players, order, to_mask(game.spies), game.failed_rounds,
+                          game.missions_lost, game.proposals))
+
+    def columns(self):
+        '''
+        returns a dictionary of column arrays
+        '''
+        names = ('seed', 'players', 'order', 'spies', 'failed_rounds', 'missions_lost', 'proposals')
+        values = list(zip(*self.rows)) if self.rows else [[] for _ in names]
+        return {name: np.array(column, dtype=COLUMNS[name][0]).reshape((-1,) + COLUMNS[name][1])
+                for name, column in zip(names, values)}
+
+
+class ResultsStore:
+    '''
+    a store in the directory path, created if needed
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        meta = os.path.join(path, 'meta.json')
+        if os.path.exists(meta):
+            with open(meta) as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {'agents': [], 'chunks': 0}
+        # (chunk, query) -> partial sums of the chunk
+        self._partials = {}
+
+    def agent_code(self, name):
+        '''
+        returns the code of an agent class name, giving it one if it is new
+        '''
+        if name not in self.meta['agents']:
+            self.meta['agents'].append(name)
+        return self.meta['agents'].index(name)
+
+    def append(self, columns, table):
+        '''
+        writes the games of columns (see GameRows) as a new chunk.
+        table is the list of agent class names of the table, in table order.
+        '''
+        if len(columns['seed']) == 0:
+            return
+        codes = np.array([self.agent_code(name) for name in table] + [EMPTY], dtype='u1')
+        order = columns['order']
+        columns = dict(columns, agents=codes[np.where(order == EMPTY, len(table), order)])
+        chunk = '%06d' % self.meta['chunks']
+        # the chunk is written aside and renamed, then meta.json is replaced,
+        # so an interrupted append leaves the store as it was
+        staging = os.path.join(self.path, chunk + '.tmp')
+        os.makedirs(staging, exist_ok=True)
+        for name, (dtype, shape) in COLUMNS.items():
+            np.save(os.path.join(staging, name + '.npy'), np.asarray(columns[name], dtype=dtype))
+        os.replace(staging, os.path.join(self.path, chunk))
+        self.meta['chunks'] += 1
+        with open(os.path.join(self.path, 'meta.json.tmp'), 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(os.path.join(self.path, 'meta.json.tmp'), os.path.join(self.path, 'meta.json'))
+
+    def __len__(self):
+        return sum(len(self.column(chunk, 'seed')) for chunk in range(self.meta['chunks']))
+
+    def column(self, chunk, name):
+        '''
+        returns a column of a chunk, memory-mapped
+        '''
+        return np.load(os.path.join(self.path, '%06d' % chunk, name + '.npy'), mmap_mode='r')
+
+    def seat_entries(self, chunk):
+        '''
+        returns the per seat entries of a chunk: a dictionary of flat arrays of SEAT_KEYS and win,
+        with one entry per seat of every game
+        '''
+        players = np.asarray(self.column(chunk, 'players'))
+        missions_lost = np.asarray(self.column(chunk, 'missions_lost'))
+        spies = np.asarray(self.column(chunk, 'spies'))
+        seats = np.arange(MAX_PLAYERS)
+        occupied = seats[None, :] < players[:, None]
+        is_spy = (spies[:, None] >> seats[None, :]) & 1
+        spies_win = (missions_lost >= 3)[:, None]
+        entries = {
+            'agent': np.asarray(self.column(chunk, 'agents')),
+            'role': np.broadcast_to(is_spy, occupied.shape),
+            'seat': np.broadcast_to(seats, occupied.shape),
+            'table_index': np.asarray(self.column(chunk, 'order')),
+            'players': np.broadcast_to(players[:, None], occupied.shape),
+            'missions_lost': np.broadcast_to(missions_lost[:, None], occupied.shape),
+            'win': (is_spy == 1) == spies_win,
+        }
+        return {key: values[occupied] for key, values in entries.items()}
+
+    def encode(self, key, value):
+        '''
+        returns the stored value of a query value: agent names and roles are given by name
+        '''
+        if key == 'agent':
+            return self.meta['agents'].index(value) if value in self.meta['agents'] else -1
+        if key == 'role':
+            return ROLES.index(value)
+        return value
+
+    def decode(self, key, value):
+        if key == 'agent':
+            return self.meta['agents'][value]
+        if key == 'role':
+            return ROLES[value]
+        return int(value)
+
+    def partial(self, chunk, by, where):
+        '''
+        returns {group: [entries, wins]} for one chunk, computed once per chunk and query
+        '''
+        query = (chunk, by, where)
+        if query not in self._partials:
+            entries = self.seat_entries(chunk)
+            keep = np.ones(len(entries['win']), dtype=bool)
+            for key, values in where:
+                keep &= np.isin(entries[key], [self.encode(key, value) for value in values])
+            groups = {}
+            if keep.any():
+                keys = np.stack([entries[key][keep] for key in by], axis=1) if by else np.zeros((keep.sum(), 0))
+                unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+                inverse = inverse.reshape(-1)
+                counts = np.bincount(inverse, minlength=len(unique))
+                wins = np.bincount(inverse, weights=entries['win'][keep], minlength=len(unique))
+                for group, count, won in zip(unique, counts, wins):
+                    groups[tuple(group)] = [int(count), int(won)]
+            self._partials[query] = groups
+        return self._partials[query]
+
+    def win_rates(self, by=('agent', 'role'), where=None):
+        '''
+        returns {group: (entries, wins, win rate)} over the seats of every game,
+        grouped by the SEAT_KEYS of by and filtered by where, a dictionary mapping
+        SEAT_KEYS to a value or a list of values, e.g. where={'players': [5, 6], 'agent': 'Grader'}
+        '''
+        by = tuple(by)
+        for key in by + tuple(where or ()):
+            if key not in SEAT_KEYS:
+                raise ValueError('unknown key %s, expected one of %s' % (key, ', '.join(SEAT_KEYS)))
+        where = tuple(sorted((key, tuple(value) if isinstance(value, (list, tuple)) else (value,))
+                             for key, value in (where or {}).items()))
+        totals = {}
+        for chunk in range(self.meta['chunks']):
+            for group, (count, won) in self.partial(chunk, by, where).items():
+                total = totals.setdefault(group, [0, 0])
+                total[0] += count
+                total[1] += won
+        return {tuple(self.decode(key, value) for key, value in zip(by, group)): (count, won, won / count)
+                for group, (count, won) in sorted(totals.items())}
+
+
+def parse_where(items):
+    '''
+    parses key=value[,value...] command line filters
+    '''
+    where = {}
+    for item in items:
+        key, _, values = item.partition('=')
+        where[key] = [value if key in ('agent', 'role') else int(value) for value in values.split(',')]
+    return where
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Win rates from a results store.')
+    parser.add_argument('store')
+    parser.add_argument('--by', nargs='*', default=['agent', 'role'], choices=SEAT_KEYS)
+    parser.add_argument('--where', nargs='*', default=[], metavar='KEY=VALUE[,VALUE]')
+    args = parser.parse_args()
+
+    store = ResultsStore(args.store)
+    print('%d games' % len(store))
+    print('%-40s %10s %10s %8s' % (' '.join(args.by), 'seats', 'wins', 'rate'))
+    for group, (count, won, rate) in store.win_rates(args.by, parse_where(args.where)).items():
+        print('%-40s %10d %10d %8.4f' % (' '.join(str(value) for value in group), count, won, rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+'''
+Local websocket server hosting games of The Resistance for remote agents (see client.py).
+One asyncio event loop serves every connection, and a game starts as soon as enough
+agents are waiting in the lobby, so many games run at once.
+Games are played by the asyncio engine (async_game.py) on the same event loop:
+the callbacks of a RemoteAgent are coroutines sending the call to the agent's client,
+and a mission's votes, like the outcome broadcasts, are sent to every client at once.
+
+The protocol is one JSON object per text message:
+    client: {"type": "join", "name": name}          waits for a game
+    server: {"type": "call", "id": i, "method": m, "args": [...]}
+    client: {"type": "result", "id": i, "value": v}   for propose_mission, vote and betray
+    server: {"type": "call", "method": m, "args": [...]}     informative callbacks, no result
+    server: {"type": "abort"}                          the game stopped (an agent left or answered wrong)
+After game_outcome, the client joins again for another game or closes the connection.
+A message which is not a JSON object of a known type, or a result before join,
+closes the connection with the code 1008 (policy violation) and the reason.
+A result must answer its request: a list of team_size distinct players for propose_mission,
+and a boolean (or null, counted as False as by the local engine) for vote and betray,
+otherwise the game is aborted.
+
+    python server.py [--port 8765] [--players 5]
+    python server.py --load-test 50 --games 500 [--agent Bounder]
+'''
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import time
+import websockets
+from agent import Agent
+from async_game import Game
+
+# callbacks whose result the game needs
+REQUESTS = ('propose_mission', 'vote', 'betray')
+# websocket close code of a client breaking the protocol
+POLICY_VIOLATION = 1008
+
+logger = logging.getLogger(__name__)
+
+
+class ProtocolError(Exception):
+    '''
+    a client sent a message or a result the protocol does not allow
+    '''
+
+
+class Connection:
+    '''
+    the server side of a client's websocket: sends calls and matches their results
+    '''
+
+    def __init__(self, websocket, name):
+        self.websocket = websocket
+        self.name = name
+        self.ids = itertools.count()
+        # request id -> future of its result
+        self.pending = {}
+
+    async def request(self, method, args):
+        '''
+        sends a call and returns its result
+        '''
+        call_id = next(self.ids)
+        result = self.pending[call_id] = asyncio.get_running_loop().create_future()
+        try:
+            await self.websocket.send(json.dumps({'type': 'call', 'id': call_id, 'method': method, 'args': args}))
+            return await result
+        finally:
+            self.pending.pop(call_id, None)
+            if result.done() and not result.cancelled():
+                # the connection may have failed it just as this request was cancelled
+                result.exception()
+
+    async def notify(self, method, args):
+        '''
+        sends a call which has no result
+        '''
+        await self.websocket.send(json.dumps({'type': 'call', 'method': method, 'args': args}))
+
+    def resolve(self, message):
+        '''
+        completes the request a result message answers
+        '''
+        result = self.pending.get(message['id'])
+        if result is not None and not result.done():
+            result.set_result(message['value'])
+
+    def close(self):
+        '''
+        fails the requests still waiting for a result
+        '''
+        for result in self.pending.values():
+            if not result.done():
+                result.set_exception(ConnectionError(self.name + ' disconnected'))
+        self.pending = {}
+
+
+class RemoteAgent(Agent):
+    '''
+    an Agent whose callbacks are played by a client: each callback is a coroutine
+    which sends the call to the client and, for a request, returns its result.
+    timeout is the time in seconds a request may take before the game is aborted (None to wait forever).
+    '''
+
+    def __init__(self, connection, timeout=None):
+        self.name = connection.name
+        self.connection = connection
+        self.timeout = timeout
+        self.number_of_players = None
+
+    async def call(self, method, *args):
+        '''
+        runs a callback on the client and returns its result
+        '''
+        if method in REQUESTS:
+            return await asyncio.wait_for(self.connection.request(method, list(args)), self.timeout)
+        await self.connection.notify(method, list(args))
+
+    def check_choice(self, method, value):
+        '''
+        returns the boolean answer to vote or betray, raising ProtocolError if it is not one
+        '''
+        if value is not None and not isinstance(value, bool):
+            raise ProtocolError('%s answered %s with %r, not a boolean' % (self.name, method, value))
+        return bool(value)
+
+    async def new_game(self, number_of_players, player_number, spies):
+        self.number_of_players = number_of_players
+        await self.call('new_game', number_of_players, player_number, spies)
+
+    async def propose_mission(self, team_size, fails_required=1):
+        team = await self.call('propose_mission', team_size, fails_required)
+        if (not isinstance(team, list) or len(team) != team_size or len(set(team)) != team_size
+                or not all(isinstance(i, int) and not isinstance(i, bool) and 0 <= i < self.number_of_players
+                           for i in team)):
+            raise ProtocolError('%s proposed %r, not a team of %d distinct players out of %d'
+                                % (self.name, team, team_size, self.number_of_players))
+        return team
+
+    async def vote(self, mission, proposer):
+        return self.check_choice('vote', await self.call('vote', mission, proposer))
+
+    async def vote_outcome(self, mission, proposer, votes):
+        await self.call('vote_outcome', mission, proposer, votes)
+
+    async def betray(self, mission, proposer):
+        return self.check_choice('betray', await self.call('betray', mission, proposer))
+
+    async def mission_outcome(self, mission, proposer, num_fails, mission_success):
+        await self.call('mission_outcome', mission, proposer, num_fails, mission_success)
+
+    async def round_outcome(self, rounds_complete, missions_failed):
+        await self.call('round_outcome', rounds_complete, missions_failed)
+
+    async def game_outcome(self, spies_win, spies):
+        await self.call('game_outcome', spies_win, spies)
+
+
+class GameServer:
+    '''
+    seats the agents joining the lobby num_players at a time and plays their games,
+    game_class is an async_game.Game class,
+    games_played and spy_wins count the finished games, games_aborted the others.
+    '''
+
+    def __init__(self, num_players=5, game_class=Game, timeout=None):
+        if num_players not in Agent.mission_sizes:
+            raise ValueError('games need 5-10 players')
+        self.num_players = num_players
+        self.game_class = game_class
+        self.timeout = timeout
+        self.lobby = []
+        self.games = set()
+        self.games_played = 0
+        self.spy_wins = 0
+        self.games_aborted = 0
+        self.finished = asyncio.Condition()
+
+    async def handler(self, websocket):
+        '''
+        serves one client until it closes its connection
+        '''
+        connection = None
+        try:
+            async for text in websocket:
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    message = None
+                kind = message.get('type') if isinstance(message, dict) else None
+                if kind == 'result' and connection is not None and 'id' in message and 'value' in message:
+                    connection.resolve(message)
+                elif kind == 'join' and isinstance(message.get('name'), str):
+                    if connection is None:
+                        connection = Connection(websocket, message['name'])
+                    self.join(connection)
+                else:
+                    reason = 'result before join' if kind == 'result' and connection is None else 'bad message'
+                    logger.warning('closing %s: %s %.100r', connection.name if connection else 'a client',
+                                   reason, text)
+                    await websocket.close(POLICY_VIOLATION, reason)
+                    break
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            if connection is not None:
+                if connection in self.lobby:
+                    self.lobby.remove(connection)
+                connection.close()
+
+    def join(self, connection):
+        '''
+        adds a connection to the lobby, and starts a game if a table is full
+        '''
+        self.lobby.append(connection)
+        if len(self.lobby) >= self.num_players:
+            table = self.lobby[:self.num_players]
+            del self.lobby[:self.num_players]
+            task = asyncio.create_task(self.host(table))
+            self.games.add(task)
+            task.add_done_callback(self.games.discard)
+
+    async def host(self, table):
+        '''
+        plays one game of the connections
+        '''
+        game = self.game_class([RemoteAgent(connection, self.timeout) for connection in table], False)
+        try:
+            await game.play()
+        except Exception as error:
+            # a client left, timed out or answered wrong: the others are told and can join again
+            if not isinstance(error, (ConnectionError, TimeoutError, websockets.ConnectionClosed)):
+                logger.warning('game of %s aborted: %r', ', '.join(c.name for c in table), error)
+            for connection in table:
+                try:
+                    await connection.websocket.send(json.dumps({'type': 'abort'}))
+                except websockets.ConnectionClosed:
+                    pass
+            async with self.finished:
+                self.games_aborted += 1
+                self.finished.notify_all()
+            return
+        async with self.finished:
+            self.games_played += 1
+            self.spy_wins += game.missions_lost >= 3
+            self.finished.notify_all()
+
+    async def wait_for(self, games, aborted=False):
+        '''
+        returns once games games are finished (or finished or aborted if aborted is True)
+        '''
+        async with self.finished:
+            await self.finished.wait_for(
+                lambda: self.games_played + (self.games_aborted if aborted else 0) >= games)
+
+    def serve(self, host='localhost', port=8765):
+        '''
+        returns the websocket server, to be used as an async context manager
+        '''
+        return websockets.serve(self.handler, host, port, compression=None, max_queue=None)
+
+
+async def load_test(agent_class, clients, games, num_players=5, port=8765):
+    '''
+    serves clients connections of agent_class on one event loop, until games games are finished,
+    and returns the number of games per second
+    '''
+    from client import play
+    server = GameServer(num_players)
+    async with server.serve('localhost', port):
+        uri = 'ws://localhost:%d' % port
+        start = time.perf_counter()
+        players = [asyncio.create_task(play(agent_class(agent_class.__name__ + str(i)), uri))
+                   for i in range(clients)]
+        await server.wait_for(games)
+        seconds = time.perf_counter() - start
+        for player in players:
+            player.cancel()
+        await asyncio.gather(*players, return_exceptions=True)
+        # the games left are aborted by the clients leaving
+        await asyncio.gather(*server.games, return_exceptions=True)
+    print('%d clients, %d games in %.2f s: %.1f games/s, spy win rate %.3f'
+          % (clients, server.games_played, seconds, server.games_played / seconds,
+             server.spy_wins / server.games_played))
+    return server.games_played / seconds
+
+
+async def serve_forever(host, port, num_players, timeout):
+    server = GameServer(num_players, timeout=timeout)
+    async with server.serve(host, port):
+        print('serving %d player games on ws://%s:%d' % (num_players, host, port))
+        await asyncio.get_running_loop().create_future()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Host games of The Resistance over websockets.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--players', type=int, default=5, choices=sorted(Agent.mission_sizes))
+    parser.add_argument('--timeout', type=float, help='seconds a request may take before its game is aborted')
+    parser.add_argument('--load-test', type=int, metavar='CLIENTS',
+                        help='connect this many local clients and report the games per second')
+    parser.add_argument('--games', type=int, default=500, help='games of the load test')
+    parser.add_argument('--agent', default='Bounder', help='agent class of the load test clients')
+    args = parser.parse_args()
+
+    if args.load_test:
+        from registry import agent_class
+        asyncio.run(load_test(agent_class(args.agent), args.load_test, args.games, args.players, args.port))
+    else:
+        asyncio.run(serve_forever(args.host, args.port, args.players, args.timeout))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+'''
+Teams (and any other set of players, e.g. the spies or the votes for a mission)
+as integer bitmasks: bit i is set iff player i is in the team.
+Subset, intersection and membership are then single integer operations:
+    a & ~b == 0     every player of a is in b
+    a & b           the players in both
+    a >> i & 1      player i is in a
+TEAMS holds every legal team of every game, built once at import.
+'''
+from itertools import combinations
+from agent import Agent
+
+
+def to_mask(indexes):
+    '''
+    returns the bitmask of a list of agent indexes (bit i is set iff i is in the list)
+    '''
+    mask = 0
+    for i in indexes:
+        mask |= 1 << i
+    return mask
+
+
+def from_mask(mask):
+    '''
+    returns the ascending list of agent indexes in a bitmask
+    '''
+    indexes = []
+    i = 0
+    while mask:
+        if mask & 1:
+            indexes.append(i)
+        mask >>= 1
+        i += 1
+    return indexes
+
+
+def team_size(mask):
+    '''
+    returns the number of players in a bitmask
+    '''
+    return bin(mask).count('1')
+
+
+def is_subset(mask, of):
+    '''
+    returns True iff every player of mask is in of
+    '''
+    return mask & ~of == 0
+
+
+# (number of players, mission size) -> the bitmasks of every team of mission size,
+# in the order of itertools.combinations(range(number of players), mission size)
+TEAMS = {(num_players, size): tuple(to_mask(team) for team in combinations(range(num_players), size))
+         for num_players, sizes in Agent.mission_sizes.items() for size in set(sizes)}
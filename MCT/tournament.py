@@ -0,0 +1,473 @@
+'''
+Tournament runner: plays many games of The Resistance and tallies the results.
+The games are sharded into chunks which are played by a pool of worker processes,
+each game is given a deterministic seed, and the tallies of the workers are merged
+into one report.
+'''
+from assignment import StratumAssignment, SeatingEnumeration, spy_sets
+from collections import namedtuple
+from contextlib import nullcontext
+from math import factorial, sqrt
+import os
+import random
+
+# a unit of work: count games with consecutive seeds from first_seed.
+# assignment is None for the default of game_class,
+# key tells the results of different strata apart,
+# log is True to return the game_log records of the games in the tally,
+# profile is True to return a profiler.Profiler of the games in the tally,
+# budget is the time budget of the agents' callbacks, if any, and the tally then has the watchdog.Watchdog,
+# store is True to return the results_store columns of the games in the tally.
+Job = namedtuple('Job', ['table', 'game_class', 'assignment', 'first_seed', 'count', 'history_rate', 'key', 'log',
+                         'profile', 'budget', 'store'],
+                 defaults=[False, False, None, False])
+
+# games a sequential run plays before it may decide that two agents differ
+MIN_DECISION_GAMES = 30
+# games of an exhaustive stratified run, beyond which run_stratified refuses it
+MAX_EXHAUSTIVE_GAMES = 1000000
+
+
+def new_tally(num_players):
+    '''
+    returns an empty tally for a table of num_players agents.
+    seat_wins_as_spy[i] and seat_wins_as_res[i] count the wins of the agent
+    at index i of the table, as a spy and as the resistance.
+    pair_wins[i][j] counts the games won by both agents i and j (pair_wins[i][i] the games won by i),
+    for comparing two agents of the same games.
+    samples holds (seed, str(game)) for the games played with full history.
+    '''
+    return {
+        'games': 0,
+        'spy_wins': 0,
+        'res_wins': 0,
+        'seat_wins_as_spy': [0] * num_players,
+        'seat_wins_as_res': [0] * num_players,
+        'pair_wins': [[0] * num_players for _ in range(num_players)],
+        'samples': [],
+    }
+
+
+def merge(tally, other):
+    '''
+    adds the counts of the tally other into tally, and returns tally
+    '''
+    for key in ('games', 'spy_wins', 'res_wins'):
+        tally[key] += other[key]
+    for key in ('seat_wins_as_spy', 'seat_wins_as_res'):
+        for seat, wins in enumerate(other[key]):
+            tally[key][seat] += wins
+    for row, other_row in zip(tally['pair_wins'], other['pair_wins']):
+        for seat, wins in enumerate(other_row):
+            row[seat] += wins
+    tally['samples'].extend(other['samples'])
+    return tally
+
+
+def record(tally, agents, game):
+    '''
+    adds the outcome of a finished game to the tally.
+    game.spies are seats of the game, which game.order maps back to the table.
+    '''
+    spies_win = game.missions_lost >= 3
+    spy_agents = [game.order[spy] for spy in game.spies]
+    tally['games'] += 1
+    if spies_win:
+        tally['spy_wins'] += 1
+    else:
+        tally['res_wins'] += 1
+    winners = []
+    for seat in range(len(agents)):
+        is_spy = seat in spy_agents
+        if spies_win and is_spy:
+            tally['seat_wins_as_spy'][seat] += 1
+            winners.append(seat)
+        elif not spies_win and not is_spy:
+            tally['seat_wins_as_res'][seat] += 1
+            winners.append(seat)
+    for seat in winners:
+        row = tally['pair_wins'][seat]
+        for other in winners:
+            row[other] += 1
+
+
+def play_game(table, game_class, seed, history=True, assignment=None, profiler=None, watchdog=None):
+    '''
+    seeds the random number generator, builds the agents of the table
+    and plays one game.
+    table is a list of (agent class, name) pairs,
+    game_class is the Game class to use (game.Game, Against.Game or async_game.Game),
+    history is False to play the game without keeping its rounds,
+    assignment replaces the game_class's way of choosing seats and spies,
+    profiler is an optional profiler.Profiler timing the agents,
+    watchdog is an optional watchdog.Watchdog enforcing time budgets on the agents.
+    Returns the agents (in table order) and the finished game.
+    '''
+    random.seed(seed)
+    agents = [agent_class(name) for agent_class, name in table]
+    options = {}
+    if assignment is not None:
+        options['assignment'] = assignment
+    if profiler is not None:
+        options['profiler'] = profiler
+    if watchdog is not None:
+        options['watchdog'] = watchdog
+    game = game_class(agents, history, **options)
+    played = game.play()
+    if played is not None:
+        # the coroutine of an async_game.Game
+        import asyncio
+        asyncio.run(played)
+    return agents, game
+
+
+def is_sampled(seed, history_rate):
+    '''
+    returns True if the game with this seed keeps its full history.
+    The decision only depends on the seed, so the same games are sampled in every run.
+    It draws from a generator seeded with a string rather than with the seed itself:
+    Random(seed) would give the first number the game draws after random.seed(seed),
+    and sample the games by their seating.
+    '''
+    return history_rate > 0 and random.Random('history %d' % seed).random() < history_rate
+
+
+def play_chunk(job):
+    '''
+    plays the games with seeds first_seed, ..., first_seed+count-1
+    and returns the job's key and their tally. This is the unit of work of a worker process.
+    '''
+    tally = new_tally(len(job.table))
+    if job.log:
+        from game_log import game_rows
+        rows = []
+    profiler = None
+    if job.profile:
+        from profiler import Profiler
+        profiler = tally['profile'] = Profiler()
+    watchdog = None
+    if job.budget is not None:
+        from watchdog import Watchdog
+        watchdog = tally['watchdog'] = Watchdog(job.budget, seed=job.first_seed)
+    if job.store:
+        from results_store import GameRows
+        stored = GameRows()
+    for seed in range(job.first_seed, job.first_seed + job.count):
+        sampled = is_sampled(seed, job.history_rate)
+        agents, game = play_game(job.table, job.game_class, seed, sampled or job.log, job.assignment, profiler,
+                                 watchdog)
+        record(tally, agents, game)
+        if sampled:
+            tally['samples'].append((seed, str(game)))
+        if job.log:
+            rows.append(game_rows(game, seed).tobytes())
+        if job.store:
+            stored.add(game, seed)
+    if job.store:
+        tally['store'] = stored.columns()
+    if watchdog is not None:
+        watchdog.close()
+    if job.log:
+        tally['log'] = b''.join(rows)
+    return job.key, tally
+
+
+def play_jobs(jobs, workers, pool=None):
+    '''
+    yields (key, tally) for every job, in the order they finish.
+    workers is the size of the process pool (default: one per core),
+    with workers=1 the jobs are played in this process.
+    pool is a multiprocessing.Pool to play the jobs in rather than a new one (workers is then ignored).
+    '''
+    if pool is not None:
+        yield from pool.imap_unordered(play_chunk, jobs)
+        return
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        for job in jobs:
+            yield play_chunk(job)
+        return
+    import multiprocessing
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap_unordered(play_chunk, jobs)
+
+
+def chunk_size_for(games, workers, chunk_size):
+    '''
+    small runs are not worth more chunks than workers
+    '''
+    workers = workers or os.cpu_count() or 1
+    return max(1, min(chunk_size, -(-games // workers)))
+
+
+def run(table, game_class, games, seed=0, workers=None, chunk_size=1000, history_rate=0.0, assignment=None,
+        log=None, profile=False, budget=None, store=None, pool=None):
+    '''
+    plays games games of the table and returns the merged tally.
+    Game i is played with seed seed+i, so a run is reproducible
+    whatever the number of workers.
+    workers is the size of the process pool (default: one per core),
+    with workers=1 all games are played in this process.
+    Games are played without history, except a fraction history_rate
+    of them (e.g. 1/10000) whose text is kept in the tally's samples for debugging.
+    assignment replaces the game_class's way of choosing seats and spies (see assignment.py).
+    log is the path of a game_log file to which every game is appended as its chunk finishes
+    (the games are then all played with history).
+    profile is True to time every agent callback: the tally's profile is then
+    the merged profiler.Profiler of all the games.
+    budget is the time in seconds given to each agent callback, after which the game
+    goes on with a fallback action: the tally's watchdog is then the merged watchdog.Watchdog
+    with the overrun statistics.
+    store is the path of a results_store directory to which the games are appended,
+    one chunk per chunk of games.
+    pool is a multiprocessing.Pool of workers processes to play in, kept open by the caller
+    (see run_sequential), rather than a pool for this run.
+    '''
+    chunk_size = chunk_size_for(games, workers, chunk_size)
+    jobs = (Job(table, game_class, assignment, seed + start, min(chunk_size, games - start), history_rate, None,
+                log is not None, profile, budget, store is not None)
+            for start in range(0, games, chunk_size))
+    tally = new_tally(len(table))
+    if profile:
+        from profiler import Profiler
+        tally['profile'] = Profiler()
+    if budget is not None:
+        from watchdog import Watchdog
+        tally['watchdog'] = Watchdog(budget)
+    writer = None
+    if log is not None:
+        from game_log import GameLogWriter
+        writer = GameLogWriter(log)
+    if store is not None:
+        from results_store import ResultsStore
+        results = ResultsStore(store)
+        names = [agent_class.__name__ for agent_class, _ in table]
+    try:
+        for _, result in play_jobs(jobs, workers, pool):
+            if writer is not None:
+                writer.write_bytes(result.pop('log'))
+            if store is not None:
+                results.append(result.pop('store'), names)
+            if profile:
+                tally['profile'].merge(result.pop('profile'))
+            if budget is not None:
+                tally['watchdog'].merge(result.pop('watchdog'))
+            merge(tally, result)
+    finally:
+        if writer is not None:
+            writer.close()
+    return tally
+
+
+def z_score(confidence, tests=1):
+    '''
+    returns the z of a two-sided normal interval at confidence, split among tests tests
+    '''
+    from statistics import NormalDist
+    return NormalDist().inv_cdf(1 - (1 - confidence) / (2 * tests))
+
+
+def wilson(wins, games, z):
+    '''
+    returns the Wilson score interval (low, high) of a win rate,
+    which unlike the normal interval does not collapse when wins is 0 or games
+    '''
+    if games == 0:
+        return 0.0, 1.0
+    p = wins / games
+    scale = 1 + z * z / games
+    centre = (p + z * z / (2 * games)) / scale
+    half = z * sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / scale
+    return centre - half, centre + half
+
+
+def intervals(tally, z):
+    '''
+    returns the Wilson intervals of the spy win rate and of the win rate of each agent of the table
+    '''
+    games = tally['games']
+    seats = range(len(tally['seat_wins_as_spy']))
+    return {
+        'spy_win_rate': wilson(tally['spy_wins'], games, z),
+        'seat_win_rate': [wilson(tally['seat_wins_as_spy'][seat] + tally['seat_wins_as_res'][seat], games, z)
+                          for seat in seats],
+    }
+
+
+def difference(tally, a, b):
+    '''
+    returns the difference between the win rates of agents a and b of the table, and its standard error.
+    Both agents play the same games, so the error is that of the mean of the per game
+    differences, which pair_wins gives.
+    '''
+    games = tally['games']
+    wins_a = tally['pair_wins'][a][a]
+    wins_b = tally['pair_wins'][b][b]
+    # games won by exactly one of them, where the difference is +-1
+    split = wins_a + wins_b - 2 * tally['pair_wins'][a][b]
+    mean = (wins_a - wins_b) / games
+    return mean, sqrt(max(0.0, split / games - mean * mean) / games)
+
+
+def stop_reason(tally, precision, compare, z, decision_z):
+    '''
+    returns why a sequential run can stop: 'precision' once the spy win rate and the win rate
+    of every agent are known to +-precision, 'decision' once the agents compare
+    are known to differ, or None to go on.
+    No decision is taken before MIN_DECISION_GAMES games: the standard error of a few games
+    is unreliable, and 0 when they all went the same way.
+    '''
+    if precision is not None:
+        bounds = intervals(tally, z)
+        widths = [bounds['spy_win_rate']] + bounds['seat_win_rate']
+        if all(high - low <= 2 * precision for low, high in widths):
+            return 'precision'
+    if compare is not None and tally['games'] >= MIN_DECISION_GAMES:
+        mean, error = difference(tally, *compare)
+        if mean != 0 and abs(mean) > decision_z * error:
+            return 'decision'
+    return None
+
+
+def run_sequential(table, game_class, precision=None, compare=None, confidence=0.95, batch=500, max_games=100000,
+                   seed=0, workers=None, chunk_size=1000, assignment=None):
+    '''
+    plays the table batch games at a time until the result is good enough, and returns the merged tally.
+    precision stops the run once the confidence interval of the spy win rate and of the win rate
+    of every agent is at most +-precision,
+    compare is a pair of table indexes (a, b) and stops the run once the win rates of a and b
+    differ significantly, whichever comes first, or after max_games games.
+    The tally's stop is why the run ended: 'precision', 'decision' or 'max_games'.
+    Game i has seed seed+i, so the tally is the one run would give for the same number of games.
+    Testing for a difference after every batch gives as many chances of a false decision,
+    so the confidence of the decision is split among the batches (Bonferroni).
+    '''
+    if precision is None and compare is None:
+        raise ValueError('run_sequential needs a precision or agents to compare')
+    looks = -(-max_games // batch)
+    z = z_score(confidence)
+    decision_z = z_score(confidence, looks)
+    tally = new_tally(len(table))
+    tally['stop'] = 'max_games'
+    workers = workers or os.cpu_count() or 1
+    import multiprocessing
+    # one pool for every batch
+    with multiprocessing.Pool(workers) if workers > 1 else nullcontext() as pool:
+        while tally['games'] < max_games:
+            count = min(batch, max_games - tally['games'])
+            merge(tally, run(table, game_class, count, seed + tally['games'], workers, chunk_size,
+                             assignment=assignment, pool=pool))
+            reason = stop_reason(tally, precision, compare, z, decision_z)
+            if reason is not None:
+                tally['stop'] = reason
+                break
+    return tally
+
+
+def run_stratified(table, game_class, games_per_stratum, seed=0, workers=None, chunk_size=1000, exhaustive=False,
+                   max_exhaustive_games=MAX_EXHAUSTIVE_GAMES):
+    '''
+    plays the table stratified by the set of spies: games_per_stratum games
+    for each of the C(n, k) sets of agents who can be the spies, with random seating,
+    or, if exhaustive, every seating of the table once for each set (n! games per set).
+    An exhaustive run of more than max_exhaustive_games games in all raises ValueError:
+    that is 7 players at most by default, 8 players are already 56 sets of 40320 seatings,
+    and 10 players 210 sets of 3628800.
+    Returns a dictionary mapping each stratum (the tuple of table indexes of the spies)
+    to its tally, see estimate and report_strata.
+    '''
+    num_players = len(table)
+    strata = spy_sets(num_players)
+    if exhaustive:
+        games_per_stratum = factorial(num_players)
+        if games_per_stratum * len(strata) > max_exhaustive_games:
+            raise ValueError('an exhaustive run of %d players is %d games, more than %d: play random seatings'
+                             % (num_players, games_per_stratum * len(strata), max_exhaustive_games))
+    chunk_size = chunk_size_for(games_per_stratum, workers, chunk_size)
+
+    def jobs():
+        for number, stratum in enumerate(strata):
+            first_seed = seed + number * games_per_stratum
+            for start in range(0, games_per_stratum, chunk_size):
+                if exhaustive:
+                    assignment = SeatingEnumeration(stratum, start)
+                else:
+                    assignment = StratumAssignment(stratum)
+                count = min(chunk_size, games_per_stratum - start)
+                yield Job(table, game_class, assignment, first_seed + start, count, 0.0, stratum)
+
+    tallies = {stratum: new_tally(num_players) for stratum in strata}
+    for stratum, result in play_jobs(jobs(), workers):
+        merge(tallies[stratum], result)
+    return tallies
+
+
+def estimate(tallies):
+    '''
+    combines the tallies of run_stratified into estimates for a random assignment,
+    under which every set of spies is equally likely: a rate is the mean of the
+    strata's rates, and its standard error sqrt(sum(p(1-p)/n)) / number of strata.
+    Returns a dictionary with the spy win rate and the win rate of each seat,
+    with their standard errors.
+    '''
+    def combine(rates):
+        mean = sum(p for p, _ in rates) / len(rates)
+        variance = sum(p * (1 - p) / n for p, n in rates) / len(rates) ** 2
+        return mean, sqrt(variance)
+
+    tallies = list(tallies.values())
+    num_players = len(tallies[0]['seat_wins_as_spy'])
+    spy_rate, spy_error = combine([(t['spy_wins'] / t['games'], t['games']) for t in tallies])
+    seat_rates = [combine([((t['seat_wins_as_spy'][seat] + t['seat_wins_as_res'][seat]) / t['games'], t['games'])
+                           for t in tallies])
+                  for seat in range(num_players)]
+    return {
+        'spy_win_rate': spy_rate,
+        'spy_win_stderr': spy_error,
+        'seat_win_rate': [rate for rate, _ in seat_rates],
+        'seat_win_stderr': [error for _, error in seat_rates],
+    }
+
+
+def report(tally, seat):
+    '''
+    prints the tally, following the agent at index seat of the table
+    '''
+    win_as_spy = tally['seat_wins_as_spy'][seat]
+    win_as_res = tally['seat_wins_as_res'][seat]
+    print('spy  wins: ', tally['spy_wins'])
+    print('res wins: ', tally['res_wins'])
+    print('When as res: ', win_as_res)
+    print('When as spy: ', win_as_spy)
+    print('total win times: ', win_as_spy + win_as_res)
+
+
+def report_sequential(tally, table, confidence=0.95):
+    '''
+    prints the number of games of run_sequential, why it stopped, and the confidence intervals
+    '''
+    z = z_score(confidence)
+    bounds = intervals(tally, z)
+    print('%d games, stopped on %s' % (tally['games'], tally['stop']))
+    print('spy win rate: %.4f [%.4f, %.4f]' % ((tally['spy_wins'] / tally['games'],) + bounds['spy_win_rate']))
+    for seat, (_, name) in enumerate(table):
+        wins = tally['seat_wins_as_spy'][seat] + tally['seat_wins_as_res'][seat]
+        print('seat %d (%s) win rate: %.4f [%.4f, %.4f]'
+              % ((seat, name, wins / tally['games']) + bounds['seat_win_rate'][seat]))
+
+
+def report_strata(tallies, table):
+    '''
+    prints the spy win rate of each stratum of run_stratified and the combined estimate
+    '''
+    for stratum, tally in sorted(tallies.items()):
+        rate = tally['spy_wins'] / tally['games']
+        spies = ', '.join(name for _, name in (table[i] for i in stratum))
+        print('spies %s: %d games, spy win rate %.4f +- %.4f'
+              % (spies, tally['games'], rate, sqrt(rate * (1 - rate) / tally['games'])))
+    combined = estimate(tallies)
+    print('spy win rate: %.4f +- %.4f' % (combined['spy_win_rate'], combined['spy_win_stderr']))
+    for seat, (_, name) in enumerate(table):
+        print('seat %d (%s) win rate: %.4f +- %.4f'
+              % (seat, name, combined['seat_win_rate'][seat], combined['seat_win_stderr'][seat]))
@@ -0,0 +1,201 @@
+'''
+Time budgets for agent callbacks.
+A Watchdog given to a Game runs every callback of its agents on a worker thread of that agent,
+and waits at most the budget of the callback for it. A callback that overruns is left to
+finish in the background, and the game goes on with a fallback action:
+a vote for the mission, a random team, no betrayal, and nothing for the informative callbacks.
+Each agent has one worker thread, kept from game to game while the agent plays,
+so an agent never runs two callbacks at once and sees its callbacks in order,
+even those the game stopped waiting for.
+Threads cannot be interrupted, so a callback that never returns keeps its agent busy:
+every later callback of that agent falls back too.
+Without a watchdog the engine does not touch the agents.
+'''
+from concurrent.futures import Future, TimeoutError
+import queue
+import random
+import threading
+import time
+from callbacks import METHODS, Patcher
+
+
+def worker(calls):
+    '''
+    runs the calls of one agent, in order, until it gets None
+    '''
+    while True:
+        call = calls.get()
+        if call is None:
+            return
+        future, function, args = call
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(function(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+class Watchdog(Patcher):
+    '''
+    budget is the time in seconds an agent is given for each callback,
+    budgets maps method names to their own budget (None for no limit).
+    stats maps (agent class name, method) to [calls, overruns, max ns],
+    where max ns is the longest the game waited for a call.
+    seed seeds the choice of the fallback teams, which never touches the random module,
+    so that a game without overruns plays the same with or without a watchdog.
+    '''
+
+    def __init__(self, budget=1.0, budgets=None, seed=0):
+        self.budgets = {method: budget for method in METHODS}
+        self.budgets.update(budgets or {})
+        self.random = random.Random(seed)
+        self.stats = {}
+        self.games = 0
+        self.slow_games = 0
+        self.num_players = 0
+        self._overruns_at_start = 0
+        # id(agent) -> (agent, its instance attributes replaced)
+        self._attached = {}
+        # id(agent) -> (agent, the call queue of its worker thread)
+        self._workers = {}
+
+    def fallback(self, method, args):
+        '''
+        returns the action taken for an agent whose callback overran
+        '''
+        if method == 'vote':
+            return True
+        if method == 'propose_mission':
+            return self.random.sample(range(self.num_players), args[0])
+        if method == 'betray':
+            return False
+        return None
+
+    def guard(self, agent, method, calls):
+        '''
+        returns a wrapper of agent's bound method which runs it on the agent's worker thread
+        and falls back once the budget of the method is spent
+        '''
+        function = getattr(agent, method)
+        budget = self.budgets[method]
+        entry = self.stats.setdefault((type(agent).__name__, method), [0, 0, 0])
+        clock = time.perf_counter_ns
+
+        def guarded(*args):
+            future = Future()
+            start = clock()
+            calls.put((future, function, args))
+            try:
+                return future.result(budget)
+            except TimeoutError:
+                entry[1] += 1
+                return self.fallback(method, args)
+            finally:
+                elapsed = clock() - start
+                entry[0] += 1
+                if elapsed > entry[2]:
+                    entry[2] = elapsed
+        return guarded
+
+    def wrap(self, agent, method):
+        return self.guard(agent, method, self._workers[id(agent)][1])
+
+    def attach(self, agents):
+        '''
+        replaces the callbacks of agents by guards (an agent listed twice is guarded once),
+        starting a worker thread for the agents which do not have one
+        '''
+        for agent in agents:
+            if id(agent) not in self._workers:
+                calls = queue.SimpleQueue()
+                threading.Thread(target=worker, args=(calls,), daemon=True,
+                                 name='watchdog-' + str(agent)).start()
+                self._workers[id(agent)] = (agent, calls)
+        super().attach(agents)
+
+    def release(self, keep=()):
+        '''
+        stops the worker threads of the agents not in keep,
+        once the calls they were given are done
+        '''
+        kept = {id(agent) for agent in keep}
+        for key in [key for key in self._workers if key not in kept]:
+            self._workers.pop(key)[1].put(None)
+
+    def close(self):
+        '''
+        stops every worker thread
+        '''
+        self.detach()
+        self.release()
+
+    def overruns(self):
+        '''
+        returns the total number of callbacks that overran their budget
+        '''
+        return sum(overruns for _, overruns, _ in self.stats.values())
+
+    def start_game(self, agents):
+        '''
+        called by Game before new_game: guards the agents,
+        and stops the worker threads of the agents of previous games who do not play this one
+        '''
+        self.num_players = len(agents)
+        self._overruns_at_start = self.overruns()
+        self.release(agents)
+        self.attach(agents)
+
+    def end_game(self):
+        '''
+        called by Game after game_outcome: releases the agents
+        '''
+        self.games += 1
+        if self.overruns() > self._overruns_at_start:
+            self.slow_games += 1
+        self.detach()
+
+    def merge(self, other):
+        '''
+        adds the statistics of other (e.g. from a worker process) to this one
+        '''
+        self.games += other.games
+        self.slow_games += other.slow_games
+        for key, (calls, overruns, longest) in other.stats.items():
+            entry = self.stats.setdefault(key, [0, 0, 0])
+            entry[0] += calls
+            entry[1] += overruns
+            entry[2] = max(entry[2], longest)
+        return self
+
+    def __getstate__(self):
+        # threads and attached agents stay in their process
+        state = self.__dict__.copy()
+        state['_attached'] = {}
+        state['_workers'] = {}
+        return state
+
+    def as_dict(self):
+        '''
+        returns the statistics as a JSON serialisable dictionary
+        '''
+        return {
+            'games': self.games,
+            'slow_games': self.slow_games,
+            'budgets': self.budgets,
+            'calls': [{'agent': agent, 'method': method, 'calls': calls, 'overruns': overruns,
+                       'max_wait_ms': longest / 1e6}
+                      for (agent, method), (calls, overruns, longest) in sorted(self.stats.items())],
+        }
+
+    def report(self):
+        '''
+        returns the overrun statistics as a table, most overrun callbacks first
+        '''
+        lines = ['%d games, %d with overruns' % (self.games, self.slow_games),
+                 '%-12s %-16s %10s %10s %8s %12s'
+                 % ('agent', 'method', 'calls', 'overruns', 'rate', 'max wait ms')]
+        for (agent, method), (calls, overruns, longest) in sorted(self.stats.items(), key=lambda s: -s[1][1]):
+            if calls:
+                lines.append('%-12s %-16s %10d %10d %7.2f%% %12.2f'
+                             % (agent, method, calls, overruns, 100 * overruns / calls, longest / 1e6))
+        return '\n'.join(lines)
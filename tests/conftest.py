@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of the game are imported by their bare names, as in MCT/__main__.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'MCT'))
@@ -0,0 +1,52 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from agent import Agent
+from agent_pool import Channel, WorkerError, decode_value, encode_value
+from callbacks import METHODS
+
+
+class EvenProposer(Agent):
+    def vote(self, mission, proposer):
+        return proposer % 2 == 0
+
+
+def test_encoding_round_trip():
+    for value in (None, True, False, 0, 7, -3, [], [0, 4, 9]):
+        out = bytearray()
+        encode_value(out, value)
+        assert decode_value(bytes(out), 0) == (value, len(out))
+
+
+def test_async_requests_past_a_full_frame_get_their_own_results():
+    # enough calls at once to fill more than one frame
+    calls = 8000
+    executor = ThreadPoolExecutor(1)
+    channel = Channel([(EvenProposer, 'e')], multiprocessing.get_context(), executor)
+
+    async def vote_all():
+        vote = METHODS.index('vote')
+        return await asyncio.gather(*(channel.request_async(0, vote, ([1, 2], proposer))
+                                      for proposer in range(calls)))
+
+    try:
+        results = asyncio.run(vote_all())
+    finally:
+        channel.close()
+        executor.shutdown()
+    assert results == [proposer % 2 == 0 for proposer in range(calls)]
+
+
+def test_a_bad_call_reaches_the_engine_as_a_worker_error():
+    channel = Channel([(EvenProposer, 'e')], multiprocessing.get_context())
+    try:
+        # slot 7 of a worker hosting one agent
+        channel.queue(7, METHODS.index('vote'), ([1, 2], 0))
+        with pytest.raises(WorkerError, match='IndexError'):
+            channel.round_trip()
+        # the worker still answers
+        channel.queue(0, METHODS.index('vote'), ([1, 2], 2))
+        assert channel.round_trip() == [True]
+    finally:
+        channel.close()
@@ -0,0 +1,38 @@
+import pytest
+from callbacks import METHODS
+from game import Game
+from profiler import Profiler
+from random_agent import RandomAgent
+from watchdog import Watchdog
+
+
+class FailingVoter(RandomAgent):
+    def vote(self, mission, proposer):
+        raise RuntimeError('vote')
+
+
+class FailingStarter(RandomAgent):
+    def new_game(self, number_of_players, player_number, spy_list):
+        raise RuntimeError('new_game')
+
+
+@pytest.mark.parametrize('failing', [FailingVoter, FailingStarter])
+def test_agents_get_their_callbacks_back_when_one_raises(failing):
+    agents = [RandomAgent(str(i)) for i in range(4)] + [failing('f')]
+    profiler, watchdog = Profiler(), Watchdog(budget=None)
+    with pytest.raises(RuntimeError):
+        Game(agents, profiler=profiler, watchdog=watchdog).play()
+    watchdog.close()
+    for agent in agents:
+        assert not set(METHODS) & set(vars(agent))
+    assert profiler.games == watchdog.games == 1
+
+
+def test_an_agent_listed_twice_is_wrapped_once():
+    agent = RandomAgent()
+    profiler = Profiler()
+    profiler.attach([agent, agent])
+    agent.new_game(5, 0, [])
+    profiler.detach()
+    assert profiler.stats['RandomAgent', 'new_game'][0] == 1
+    assert 'new_game' not in vars(agent)
@@ -0,0 +1,71 @@
+import random
+from agent import Agent
+from game import Game
+from game_log import HEADER_SIZE, RECORD, GameLogReader, GameLogWriter, game_rows
+from replay import replay
+
+
+class Steady(Agent):
+    # the same decisions in the game and in the replay
+    def new_game(self, number_of_players, player_number, spy_list):
+        self.number_of_players = number_of_players
+        self.player_number = player_number
+
+    def propose_mission(self, team_size, fails_required=1):
+        return [(self.player_number + i) % self.number_of_players for i in range(team_size)]
+
+    def vote(self, mission, proposer):
+        return proposer % 2 == 0
+
+    def betray(self, mission, proposer):
+        return True
+
+
+def play(seed):
+    random.seed(seed)
+    game = Game([Steady(str(i)) for i in range(5)])
+    game.play()
+    return game
+
+
+def test_games_round_trip(tmp_path):
+    path = tmp_path / 'games.log'
+    games = [play(seed) for seed in range(3)]
+    with GameLogWriter(path) as writer:
+        for seed, game in enumerate(games[:2]):
+            writer.write(game, seed)
+    with GameLogWriter(path) as writer:
+        writer.write(games[2], 2)
+    reader = GameLogReader(path)
+    logged = list(reader.games())
+    assert [game_id for game_id, _ in logged] == [0, 1, 2]
+    for (game_id, rows), game in zip(logged, games):
+        assert rows.tobytes() == game_rows(game, game_id).tobytes()
+        assert int(rows[0]['missions_lost']) == game.missions_lost
+
+
+def test_appending_after_a_partial_record_keeps_records_aligned(tmp_path):
+    path = tmp_path / 'games.log'
+    first, second = play(0), play(1)
+    with GameLogWriter(path) as writer:
+        writer.write(first, 0)
+    with open(path, 'ab') as f:
+        f.write(b'\xff' * (RECORD.itemsize // 2))
+    assert GameLogReader(path).outcomes()['game'].tolist() == [0]
+    with GameLogWriter(path) as writer:
+        writer.write(second, 1)
+    assert (path.stat().st_size - HEADER_SIZE) % RECORD.itemsize == 0
+    reader = GameLogReader(path)
+    assert [game_id for game_id, _ in reader.games()] == [0, 1]
+    assert reader.records[len(reader) - len(game_rows(second, 1)):].tobytes() == game_rows(second, 1).tobytes()
+
+
+def test_replay_of_the_same_agent_does_not_diverge(tmp_path):
+    path = tmp_path / 'games.log'
+    with GameLogWriter(path) as writer:
+        for seed in range(5):
+            writer.write(play(seed), seed)
+    decisions, first = replay(Steady('r'), path, table_index=3, stop_at_divergence=False)
+    assert first is None
+    assert {d.method for d in decisions} >= {'propose_mission', 'vote'}
+    assert {d.game for d in decisions} == set(range(5))
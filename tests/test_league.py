@@ -0,0 +1,9 @@
+from league import League
+
+
+def test_settled_ignores_the_spy_rating_of_agents_who_cannot_spy():
+    league = League(['RandomAgent', 'MCTAgent'])
+    for key, rating in league.ratings.items():
+        if key != ('MCTAgent', 'spy'):
+            rating[1] = 10.0 ** 2
+    assert league.run(5, settled=20) == 0
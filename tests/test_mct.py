@@ -0,0 +1,58 @@
+import random
+from agent import Agent
+import MCT_decision
+from MCT_agent import MCTAgent
+from MCT_decision import MCT_Resistance_Node, MCTSearch, RandomRollout
+from teams import from_mask, team_size
+
+
+def test_deal_agrees_with_the_missions_played():
+    rollout = RandomRollout(resistance=[0])
+    rollout.observe([1, 2], 1)
+    rollout.observe([3, 4], 1)
+    node = MCT_Resistance_Node([3, 4], False, 1, 2, True, 5, list(range(5)))
+    random.seed(0)
+    worlds = {rollout.deal(node) for _ in range(200)}
+    assert sorted(sorted(from_mask(spies)) for spies in worlds) == [[1, 3], [1, 4], [2, 3], [2, 4]]
+
+
+def test_children_are_teams_of_the_next_mission():
+    for number_of_players in range(5, 11):
+        for round_index in range(4):
+            node = MCT_Resistance_Node([0, 1], True, round_index, 0, True, number_of_players,
+                                       list(range(number_of_players)))
+            node.expand()
+            size = Agent.mission_sizes[number_of_players][round_index + 1]
+            assert node.children and all(team_size(child.team_mask) == size for child in node.children)
+
+
+def test_shutdown_stops_the_workers_of_parallel_searches():
+    node = MCT_Resistance_Node([0, 1], True, 0, 0, True, 5, list(range(5)))
+    try:
+        child = MCTSearch(node, RandomRollout(resistance=[0]), workers=2).best_action([], iterations=200)
+        pool = MCT_decision._EXECUTORS[2]
+    finally:
+        MCT_decision.shutdown()
+    assert team_size(child.team_mask) == Agent.mission_sizes[5][1]
+    assert not MCT_decision._EXECUTORS
+    assert not pool._processes
+
+
+def test_best_action_falls_back_to_a_random_team_when_every_choice_has_failed():
+    random.seed(0)
+    node = MCT_Resistance_Node([0, 1], True, 0, 0, True, 5, list(range(5)))
+    # every team of the next mission is part of a failed team
+    child = MCTSearch(node, RandomRollout(resistance=[0])).best_action([0b11111], iterations=50)
+    assert team_size(child.team_mask) == Agent.mission_sizes[5][1]
+    assert node.best_child([0b11111]) is None
+
+
+def test_a_new_game_forgets_the_failed_teams():
+    agent = MCTAgent()
+    agent.new_game(5, 0, [])
+    agent.mission_outcome([1, 2], 1, 1, False)
+    agent.game_outcome(True, [1, 2])
+    assert agent.teams_failed == []
+    agent.teams_failed.append(0b110)
+    agent.new_game(5, 0, [])
+    assert agent.teams_failed == []
@@ -0,0 +1,51 @@
+import random
+from MCT_arrays import array_root
+from MCT_decision import MCTSearch, RandomRollout
+
+
+def shape(node):
+    # the statistics of a subtree, children in the order of node.children
+    return (node.team_mask, node.outcome, node.vote, node.round_index, node.missions_failed,
+            node.n, node.q, [shape(child) for child in node.children])
+
+
+def count(node):
+    return 1 + sum(count(child) for child in node.children)
+
+
+def search(iterations=300):
+    random.seed(0)
+    root = array_root([0, 1], True, 0, 0, True, 5, list(range(5)))
+    MCTSearch(root, RandomRollout(resistance=[0])).run(iterations)
+    return root
+
+
+def test_child_finds_every_child():
+    root = search()
+    for node in (root, root.children[0]):
+        for child in node.children:
+            found = node.child(child.team, child.outcome, child.vote)
+            assert found.index == child.index and found.parent.index == node.index
+
+
+def test_detach_copies_the_subtree_into_a_tree_of_its_own():
+    root = search()
+    child = max(root.children, key=lambda c: c.n)
+    expected = shape(child)
+    tree = root.tree
+    child.detach()
+    assert child.tree is not tree and child.index == 0 and child.parent is None
+    assert child.tree.size == count(child) < tree.size
+    assert shape(child) == expected
+    for grandchild in child.children:
+        assert child.child(grandchild.team, grandchild.outcome, grandchild.vote).index == grandchild.index
+        assert grandchild.parent.index == 0
+    # the search goes on in the new tree
+    MCTSearch(child, RandomRollout(resistance=[0])).run(100)
+    assert child.n == expected[5] + 100
+
+
+def test_best_child_is_none_when_every_choice_has_failed():
+    root = search(50)
+    assert root.best_child([0b11111]) is None
+    assert root.best_child([]) is not None
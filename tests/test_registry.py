@@ -0,0 +1,15 @@
+import pytest
+from random_agent import RandomAgent
+from registry import ENGINES, RUNNERS, run_engine
+
+TABLE = [(RandomAgent, 'r%d' % i) for i in range(5)]
+
+
+@pytest.mark.parametrize('name', list(ENGINES) + list(RUNNERS))
+def test_every_engine_plays_a_table(name):
+    tally = run_engine(name, TABLE, 20, seed=3, workers=1)
+    assert tally['games'] == tally['spy_wins'] + tally['res_wins'] == 20
+
+
+def test_the_async_engine_plays_the_games_of_game():
+    assert run_engine('async', TABLE, 50, workers=1) == run_engine('game', TABLE, 50, workers=1)
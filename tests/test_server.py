@@ -0,0 +1,58 @@
+import asyncio
+import json
+import pytest
+
+websockets = pytest.importorskip('websockets')
+from client import play
+from random_agent import RandomAgent
+from server import GameServer, POLICY_VIOLATION
+
+
+class WrongTeamAgent(RandomAgent):
+    def propose_mission(self, team_size, fails_required=1):
+        return list(range(team_size + 1))
+
+
+class StringVoteAgent(RandomAgent):
+    def vote(self, mission, proposer):
+        return 'yes'
+
+
+async def serve(agents, games=1, aborted=True):
+    server = GameServer(5, timeout=5)
+    async with server.serve('localhost', 0) as websocket_server:
+        port = websocket_server.sockets[0].getsockname()[1]
+        players = [asyncio.create_task(play(agent, 'ws://localhost:%d' % port)) for agent in agents]
+        await asyncio.wait_for(server.wait_for(games, aborted), 10)
+        for player in players:
+            player.cancel()
+        await asyncio.gather(*players, return_exceptions=True)
+        await asyncio.gather(*server.games, return_exceptions=True)
+    return server
+
+
+@pytest.mark.parametrize('bad_agent', [WrongTeamAgent, StringVoteAgent])
+def test_bad_reply_aborts_the_game(bad_agent):
+    agents = [RandomAgent('r%d' % i) for i in range(4)] + [bad_agent('bad')]
+    server = asyncio.run(serve(agents))
+    assert server.games_aborted >= 1
+
+
+def test_good_clients_play():
+    server = asyncio.run(serve([RandomAgent('r%d' % i) for i in range(5)], games=3, aborted=False))
+    assert server.games_played >= 3
+
+
+@pytest.mark.parametrize('message', ['{"type": "result", "id": 0, "value": true}', 'not json', '{"name": "x"}', '[]'])
+def test_bad_message_closes_the_connection(message):
+    async def send():
+        server = GameServer(5)
+        async with server.serve('localhost', 0) as websocket_server:
+            port = websocket_server.sockets[0].getsockname()[1]
+            async with websockets.connect('ws://localhost:%d' % port) as websocket:
+                await websocket.send(message)
+                with pytest.raises(websockets.ConnectionClosed) as closed:
+                    await asyncio.wait_for(websocket.recv(), 5)
+                return closed.value
+    closed = asyncio.run(send())
+    assert closed.rcvd.code == POLICY_VIOLATION
@@ -0,0 +1,25 @@
+from itertools import combinations
+from agent import Agent
+from teams import TEAMS, from_mask, is_subset, team_size, to_mask
+
+
+def test_masks_round_trip():
+    for players in ([], [0], [2, 7], [0, 1, 4, 9]):
+        mask = to_mask(players)
+        assert from_mask(mask) == players
+        assert team_size(mask) == len(players)
+    # the order and repeats of a list do not matter
+    assert to_mask([3, 1, 3]) == to_mask([1, 3]) == 0b1010
+
+
+def test_is_subset():
+    assert is_subset(to_mask([1, 3]), to_mask([0, 1, 3]))
+    assert is_subset(0, to_mask([2]))
+    assert not is_subset(to_mask([1, 4]), to_mask([0, 1, 3]))
+
+
+def test_teams_are_every_team_of_every_mission():
+    for num_players, sizes in Agent.mission_sizes.items():
+        for size in sizes:
+            teams = TEAMS[num_players, size]
+            assert [from_mask(team) for team in teams] == [list(c) for c in combinations(range(num_players), size)]
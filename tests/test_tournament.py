@@ -0,0 +1,128 @@
+import random
+import statistics
+from collections import Counter
+from math import sqrt
+import pytest
+import tournament
+from assignment import random_assignment
+from game import Game
+from tournament import (difference, intervals, is_sampled, merge, new_tally, run_sequential, run_stratified,
+                        stop_reason, wilson, z_score)
+
+
+def test_is_sampled_rate():
+    sampled = sum(is_sampled(seed, 0.05) for seed in range(20000))
+    assert 800 < sampled < 1200
+    assert not any(is_sampled(seed, 0) for seed in range(1000))
+
+
+def test_sampled_seatings_are_not_biased():
+    # the seat of agent 0 in the sampled games, seated as play_game seats them
+    seats = Counter()
+    for seed in range(40000):
+        if is_sampled(seed, 0.05):
+            random.seed(seed)
+            order, _ = random_assignment(5)
+            seats[order.index(0)] += 1
+    total = sum(seats.values())
+    assert len(seats) == 5
+    for seat in range(5):
+        assert abs(seats[seat] - total / 5) < 0.25 * total / 5
+
+
+def test_z_score():
+    assert abs(z_score(0.95) - 1.95996) < 1e-4
+    # 10 tests share the 5% of errors
+    assert abs(z_score(0.95, 10) - 2.80703) < 1e-4
+
+
+def test_wilson_interval():
+    low, high = wilson(5, 10, 1.96)
+    assert abs(low - 0.23659) < 1e-4 and abs(high - 0.76341) < 1e-4
+    # it does not collapse when every game is lost
+    low, high = wilson(0, 10, 1.96)
+    assert abs(low) < 1e-12 and abs(high - 0.27753) < 1e-4
+    assert wilson(0, 0, 1.96) == (0.0, 1.0)
+
+
+def test_intervals_of_a_tally():
+    tally = new_tally(2)
+    tally.update(games=100, spy_wins=40, res_wins=60, seat_wins_as_spy=[10, 30], seat_wins_as_res=[40, 0])
+    bounds = intervals(tally, 1.96)
+    assert bounds['spy_win_rate'] == wilson(40, 100, 1.96)
+    assert bounds['seat_win_rate'] == [wilson(50, 100, 1.96), wilson(30, 100, 1.96)]
+
+
+def test_paired_difference_is_that_of_the_per_game_differences():
+    # 10 games: a alone won 4, b alone 1, both 2, neither 3
+    per_game = [1] * 4 + [-1] + [0] * 5
+    tally = new_tally(2)
+    tally['games'] = 10
+    tally['pair_wins'] = [[6, 2], [2, 3]]
+    mean, error = difference(tally, 0, 1)
+    assert abs(mean - statistics.mean(per_game)) < 1e-12
+    assert abs(error - statistics.pstdev(per_game) / sqrt(10)) < 1e-12
+    assert difference(tally, 1, 0) == (-mean, error)
+
+
+def batch_of(count):
+    # a batch in which agent 0 alone won 25 games of 500 and agent 1 alone 15
+    tally = new_tally(2)
+    tally['games'] = count
+    tally['pair_wins'] = [[25, 0], [0, 15]]
+    return tally
+
+
+def test_sequential_decisions_split_the_confidence_among_the_looks(monkeypatch):
+    # the difference is 1.59 standard errors after one batch, 2.24 after 2, 2.75 after 3:
+    # beyond 1.96 after 2 batches, but beyond the 2.50 of 4 looks only after 3
+    monkeypatch.setattr(tournament, 'run', lambda table, game_class, count, *args, **kwargs: batch_of(count))
+    tally = run_sequential([None, None], None, compare=(0, 1), batch=500, max_games=2000)
+    assert tally['stop'] == 'decision' and tally['games'] == 1500
+    z = z_score(0.95)
+    assert stop_reason(tally, None, (0, 1), z, z) == 'decision'
+    assert stop_reason(merge(batch_of(500), batch_of(500)), None, (0, 1), z, z_score(0.95, 4)) is None
+
+
+def test_sequential_precision(monkeypatch):
+    monkeypatch.setattr(tournament, 'run', lambda table, game_class, count, *args, **kwargs: batch_of(count))
+    tally = run_sequential([None, None], None, precision=0.05, batch=100, max_games=10000)
+    assert tally['stop'] == 'precision'
+    bounds = intervals(tally, z_score(0.95))
+    assert all(high - low <= 0.1 for low, high in [bounds['spy_win_rate']] + bounds['seat_win_rate'])
+    tally = run_sequential([None, None], None, precision=0.001, batch=500, max_games=1000)
+    assert tally['stop'] == 'max_games' and tally['games'] == 1000
+
+
+def test_no_decision_on_a_few_one_sided_games():
+    # agent 0 won all 5 games and agent 1 none: the paired standard error is 0
+    tally = new_tally(2)
+    tally['games'] = 5
+    tally['pair_wins'] = [[5, 0], [0, 0]]
+    assert difference(tally, 0, 1) == (1.0, 0.0)
+    assert stop_reason(tally, None, (0, 1), 1.96, 1.96) is None
+
+
+def test_sequential_batches_share_one_pool(monkeypatch):
+    import multiprocessing
+    from random_agent import RandomAgent
+    pools = []
+    Pool = multiprocessing.Pool
+
+    def counted(*args, **kwargs):
+        pools.append(args)
+        return Pool(*args, **kwargs)
+    monkeypatch.setattr(multiprocessing, 'Pool', counted)
+    table = [(RandomAgent, 'r%d' % i) for i in range(5)]
+    tally = run_sequential(table, Game, precision=0.001, batch=20, max_games=60, workers=2)
+    assert tally['games'] == 60 and tally['stop'] == 'max_games'
+    assert pools == [(2,)]
+
+
+def test_exhaustive_stratified_runs_are_capped():
+    from random_agent import RandomAgent
+    table = [(RandomAgent, 'r%d' % i) for i in range(8)]
+    with pytest.raises(ValueError):
+        run_stratified(table, None, 0, exhaustive=True)
+    tallies = run_stratified(table[:5], Game, 0, workers=1, exhaustive=True)
+    assert len(tallies) == 10 and all(tally['games'] == 120 for tally in tallies.values())